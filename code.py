@@ -7,6 +7,12 @@ import displayio # <<--- AGGIUNGI QUESTO IMPORT
 from i2cdisplaybus import I2CDisplayBus
 import adafruit_displayio_ssd1306
 import random
+try:
+    import asyncio # Non è nel firmware: lib/asyncio e lib/adafruit_ticks dal bundle CircuitPython
+except ImportError:
+    asyncio = None # Senza asyncio si usa il loop semplice in fondo al file
+
+_boot_t0 = time.monotonic() # Per misurare il tempo dal boot al primo frame (recupero dopo reset watchdog)
 
 # Importa la classe e le costanti necessarie dalla libreria
 from robo_eyes_cp import RoboEyesCP 
@@ -44,51 +50,83 @@ except Exception as e:
 # Se l'hai chiamata RoboEyesCP, usa RoboEyesCP.
 # Dall'errore precedente, sembra che tu voglia RoboEyesCP.
 eyes = RoboEyesCP(display) 
+# Registrazione della sessione (prima di begin()), da riprodurre sull'host con eyes.replay():
+# gli eventi vanno sul file man mano, niente lista in RAM
+# eyes.start_recording(open("/sd/robo_eyes_trace.jsonl", "w"))
+
+TARGET_FPS_LIB = 20 
+# Il frame rate di begin() imposta frame_interval_ms: il ritmo di eyes.run()/next_due() e
+# il riferimento per i frame in ritardo/persi nelle statistiche
+eyes.begin(SCREEN_WIDTH, SCREEN_HEIGHT, TARGET_FPS_LIB)
+# Backend alternativo senza copie di pixel (sprite sheet + TileGrid per occhio):
+# from robo_eyes_cp import CP_BACKEND_TILEGRID
+# eyes.begin(SCREEN_WIDTH, SCREEN_HEIGHT, TARGET_FPS_LIB, CP_BACKEND_TILEGRID)
+
+print(f"Sprite: {eyes.sprite_source} in {eyes.sprite_setup_ms} ms") # "pack" se /sd/robo_eyes_sprites.bin è valido
+
+# Refresh manuale: il display viene aggiornato solo quando gli occhi cambiano davvero
+# (a riposo niente traffico I2C). update() ritorna True se ha prodotto un frame.
+eyes.set_refresh_on_change(True)
 
-TARGET_FPS_LIB = 8 
-# eyes.begin(SCREEN_WIDTH, SCREEN_HEIGHT, TARGET_FPS_LIB) # La libreria C++ ha frame_rate in begin,
-                                                       # la nostra versione Python non lo usa in begin
-                                                       # ma il loop principale dovrebbe dettare il ritmo
-eyes.begin(SCREEN_WIDTH, SCREEN_HEIGHT, TARGET_FPS_LIB) # Passare frame_rate a begin è ok,
-                                                        # anche se la classe Python non lo usa per il timing interno
-                                                        # ma per inizializzare frame_interval_ms
+# Statistiche di update() (tempi per fase, frame in ritardo, memoria/GC): una riga sulla seriale
+# ogni STATS_PERIOD_S secondi. Metti STATS_PERIOD_S = 0 per non raccoglierle.
+STATS_PERIOD_S = 10
+eyes.enable_stats(STATS_PERIOD_S > 0)
+
+# Modalità demo/kiosk: riproduce uno stream registrato con tools/record_stream.py invece
+# della logica procedurale (al posto di asyncio.run(main()) qui sotto):
+# from robo_eyes_stream import StreamPlayer
+# player = StreamPlayer(open("/sd/robo_eyes_stream.bin", "rb"), eyes.screen_bitmap)
+# while True:
+#     if player.update(): eyes.pending_damage = player.damage_rect; eyes.flush_refresh()
+#     time.sleep(0.02)
 
 # Impostazioni opzionali (dovrai implementare questi metodi setter in RoboEyesCP)
 # eyes.set_autoblinker(True, 2, 4) 
 # eyes.set_idle_mode(True, 1, 3)
 
 # --- Loop Principale ---
+# eyes.run() è un task asyncio: dorme fino al prossimo evento (frame di blink, mossa idle,
+# fine stato o comando), così sensori e rete possono girare negli altri task senza jitter.
+# Dagli altri task: eyes.look_at(x, y) con x, y in -1.0..1.0, eyes.set_mood(CP_STATE_HAPPY),
+# eyes.blink(). Non bloccano, e una raffica di comandi produce un solo ridisegno.
+# Se asyncio non è installato gira un loop update()/sleep con lo stesso ritmo, senza altri task.
 print("Avvio loop principale...")
-TARGET_FPS_MAIN_LOOP = 8 # Questo FPS controllerà la frequenza di chiamata di eyes.update()
-FRAME_INTERVAL_S_MAIN = 1.0 / TARGET_FPS_MAIN_LOOP
-last_frame_target_time_main = time.monotonic()
 
 # Lista di stati possibili per il cambio casuale
 possible_states = [CP_STATE_DEFAULT, CP_STATE_HAPPY, CP_STATE_SLEEPY, CP_STATE_SURPRISED]
 
+eyes.update() # Primo frame
+print(f"Boot -> primo frame: {int((time.monotonic() - _boot_t0) * 1000)} ms")
+
+async def stats_task():
+    while True:
+        await asyncio.sleep(STATS_PERIOD_S)
+        print("stats", eyes.stats.compact())
+        eyes.stats.reset()
+
+async def mood_task():
+    # Esempio di controllo esterno: un cambio di mood casuale ogni 5-10 s
+    while True:
+        await asyncio.sleep(random.uniform(5, 10))
+        eyes.set_mood(random.choice(possible_states))
+
+async def main():
+    tasks = [asyncio.create_task(eyes.run())]
+    if eyes.stats is not None: tasks.append(asyncio.create_task(stats_task()))
+    # tasks.append(asyncio.create_task(mood_task())) # Se vuoi un controllo esterno del mood
+    await asyncio.gather(*tasks)
 
-while True:
-    # La classe RoboEyesCP.update() esegue la logica e il disegno ad ogni chiamata.
-    # Il loop principale qui è responsabile del timing.
-    eyes.update() 
-
-    # Non è necessario un cambio di mood casuale qui se la libreria lo gestisce internamente
-    # con next_state_eval_time. Se vuoi un controllo esterno, puoi decommentare:
-    # current_time_mood = time.monotonic()
-    # if current_time_mood - last_mood_change_time > mood_change_interval:
-    #     new_mood = random.choice(possible_states)
-    #     eyes.set_mood(new_mood) # Dovrai implementare set_mood in RoboEyesCP
-    #     last_mood_change_time = current_time_mood
-    #     mood_change_interval = random.uniform(5,10)
-
-    # Logica di Frame Rate per il Loop Principale
-    current_loop_time = time.monotonic()
-    next_target = last_frame_target_time_main + FRAME_INTERVAL_S_MAIN
-    sleep_for = next_target - current_loop_time
-    if sleep_for > 0:
-        time.sleep(sleep_for)
-    
-    last_frame_target_time_main = next_target
-    # Anti-drift per il loop principale
-    if current_loop_time - last_frame_target_time_main > FRAME_INTERVAL_S_MAIN * 1.5:
-       last_frame_target_time_main = current_loop_time
\ No newline at end of file
+if asyncio is not None:
+    asyncio.run(main())
+else:
+    # Loop senza asyncio: update() e poi sleep fino a quando c'è di nuovo qualcosa da fare
+    next_stats = time.monotonic() + STATS_PERIOD_S
+    while True:
+        eyes.update()
+        now = time.monotonic()
+        if eyes.stats is not None and now >= next_stats:
+            print("stats", eyes.stats.compact())
+            eyes.stats.reset()
+            next_stats = now + STATS_PERIOD_S
+        time.sleep(eyes.time_to_next_event())
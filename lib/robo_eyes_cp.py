@@ -1,317 +1,1359 @@
-import time
-import random
-import bitmaptools
-import displayio # Necessario per i tipi displayio.Bitmap, displayio.Palette, displayio.Group
-
-# --- Costanti usate dalla classe ---
-CP_BGCOLOR = 0
-CP_MAINCOLOR = 1
-
-# Stati/Espressioni (queste costanti possono essere usate anche da code.py se importate)
-CP_STATE_DEFAULT = "default"
-CP_STATE_HAPPY = "happy"
-CP_STATE_SLEEPY = "sleepy"
-CP_STATE_SURPRISED = "surprised"
-CP_STATE_ANGRY = "angry" # Aggiungiamo ANGRY come placeholder
-
-CP_ACTION_BLINK = "blinking"
-
-EDGE_MARGIN = 5 
-# Flag di debug specifico per questa libreria
-LIB_DEBUG_MODE = False # Imposta a True per stampe interne alla libreria
-
-class RoboEyesCP: # Il nome della classe che verrà importato
-    def __init__(self, display_driver_instance): # Accetta l'oggetto display fisico
-        self.display_driver = display_driver_instance # Salva il riferimento al display passato
-        self.screen_width = 0 
-        self.screen_height = 0
-
-        # Palette e Bitmap principali saranno creati in begin()
-        self.screen_palette = None
-        self.screen_bitmap = None
-        self.screen_tile_grid = None
-        self.main_group = None # Il gruppo che questa classe gestisce e mostra
-
-        # --- Parametri e Sprite Occhi ---
-        self.base_eye_width = 36
-        self.base_eye_height = 36
-        self.eye_border_radius = 8
-
-        # Sprite verranno creati in _setup_sprites() chiamato da begin()
-        self.sprite_eye_open = None
-        self.sprite_eye_happy_form = None
-        self.sprite_eye_sleepy_form = None
-        self.sprite_eye_line = None
-        self.sprite_eye_surprised_open = None # Può essere lo stesso di open
-        self.blink_animation_sprites = []
-        self.blink_anim_frame_count = 0
-        
-        # Palette per palpebre di Emozione (se decidiamo di usarle separatamente)
-        # Per ora, le emozioni cambiano lo sprite intero dell'occhio.
-        # self.emotion_lid_palette = None 
-        # self.eyelid_angry_L = None
-        # self.eyelid_angry_R = None
-
-
-        # --- Stato Occhi (Posizione, Target) ---
-        self.eyeL_x, self.eyeL_y = 0.0, 0.0
-        self.eyeR_x, self.eyeR_y = 0.0, 0.0
-        self.eye_target_L_x, self.eye_target_L_y = 0.0, 0.0
-        self.eye_target_R_x, self.eye_target_R_y = 0.0, 0.0
-        
-        self.eye_default_spacing = 10
-        self.eye_default_L_x = 0.0; self.eye_default_L_y = 0.0
-        self.eye_default_R_x = 0.0; self.eye_default_R_y = 0.0
-
-        # --- Sistema di Stati/Azioni ---
-        self.current_state = CP_STATE_DEFAULT
-        self.state_start_time = 0.0
-        self.state_duration = 0.0
-        self.expression_eval_interval_s = 5.0 
-        self.expression_eval_interval_variation_s = 5.0
-        self.next_state_eval_time = 0.0
-
-        self.is_performing_blink_anim = False 
-        self.blink_anim_current_frame = 0
-        self.blink_anim_next_frame_time = 0.0
-        self.blink_frame_duration = 0.07 # Durata di ogni frame del blink
-
-        # --- Movimento Idle ---
-        self.idle_active = True
-        self.idle_interval_s = 2.0 
-        self.idle_interval_variation_s = 2.0
-        self.idle_next_time = 0.0
-        
-        self._last_debug_print_time = 0.0 # Per stampe di debug temporizzate
-        # Nota: LIB_DEBUG_MODE è globale a questo file, non self.DEBUG_MODE
-
-    def _get_random_delay(self, base, variation):
-        return base + random.uniform(0, variation)
-
-    def _constrain(self, val, min_val, max_val):
-        actual_max = max(min_val, max_val) # Evita che min > max in constrain
-        return max(min_val, min(val, actual_max))
-
-    def _create_round_rect_sprite(self, width, height, radius, color_index_draw, color_index_bg, palette_to_use):
-        _w, _h, _r = int(width), int(height), int(radius)
-        _r = min(_r, _w // 2, _h // 2)
-        if _r < 0: _r = 0
-        sprite = displayio.Bitmap(_w, _h, len(palette_to_use))
-        sprite.fill(color_index_bg)
-        if _w <= 0 or _h <= 0: return sprite
-        if _w > 2 * _r and _h > 0: bitmaptools.fill_region(sprite, _r, 0, _w - _r, _h, color_index_draw)
-        if _h > 2 * _r and _w > 0: bitmaptools.fill_region(sprite, 0, _r, _w, _h - _r, color_index_draw)
-        if _r > 0:
-            def _draw_filled_circle_on_sprite(s_b, cx, cy, r_c, c_idx):
-                for xo in range(-r_c, r_c + 1):
-                    for yo in range(-r_c, r_c + 1):
-                        if xo*xo + yo*yo <= r_c*r_c:
-                            px,py = cx+xo, cy+yo
-                            if 0<=px<s_b.width and 0<=py<s_b.height: s_b[px,py]=c_idx
-            _draw_filled_circle_on_sprite(sprite, _r, _r, _r, color_index_draw)
-            _draw_filled_circle_on_sprite(sprite, _w - _r - 1, _r, _r, color_index_draw)
-            _draw_filled_circle_on_sprite(sprite, _r, _h - _r - 1, _r, color_index_draw)
-            _draw_filled_circle_on_sprite(sprite, _w - _r - 1, _h - _r - 1, _r, color_index_draw)
-        elif _w > 0 and _h > 0 : sprite.fill(color_index_draw)
-        return sprite
-
-    def _setup_sprites(self):
-        # Sprite Principali
-        self.sprite_eye_open = self._create_round_rect_sprite(
-            self.base_eye_width, self.base_eye_height, self.eye_border_radius, CP_MAINCOLOR, CP_BGCOLOR, self.screen_palette)
-        
-        h_half = max(1, int(self.base_eye_height * 0.55))
-        h_line = max(1, 6) 
-        blink_h_intermediate = max(1, int(self.base_eye_height * 0.35))
-
-        self.sprite_eye_happy_form = self._create_round_rect_sprite(
-            self.base_eye_width, h_half, self.eye_border_radius // 2 if self.eye_border_radius > 1 else 1, 
-            CP_MAINCOLOR, CP_BGCOLOR, self.screen_palette)
-        self.sprite_eye_sleepy_form = self._create_round_rect_sprite( # Era mostly_closed
-            self.base_eye_width, h_line, 2 if h_line > 3 else 1, CP_MAINCOLOR, CP_BGCOLOR, self.screen_palette)
-        # self.sprite_eye_line era uguale a sleepy_form, possiamo unificarli o tenerli separati
-        # Per ora, usiamo sleepy_form anche per la linea del blink.
-        
-        self.sprite_eye_surprised_open = self.sprite_eye_open 
-        
-        sprite_blink_intermediate = self._create_round_rect_sprite(
-            self.base_eye_width, blink_h_intermediate, self.eye_border_radius // 3 if self.eye_border_radius > 2 else 1,
-            CP_MAINCOLOR, CP_BGCOLOR, self.screen_palette)
-        
-        self.blink_animation_sprites = [
-            self.sprite_eye_open, 
-            sprite_blink_intermediate,
-            self.sprite_eye_sleepy_form, # Usa lo sprite sleepy come "chiuso" nel blink
-            sprite_blink_intermediate,
-            self.sprite_eye_open,
-        ]
-        self.blink_anim_frame_count = len(self.blink_animation_sprites)
-
-
-    def _blit_sprite(self, source_bitmap, dest_x, dest_y, skip_index_in_source_palette=None):
-        _dest_x_int = round(dest_x); _dest_y_int = round(dest_y)
-        if _dest_x_int + source_bitmap.width <= 0 or \
-           _dest_x_int >= self.screen_width or \
-           _dest_y_int + source_bitmap.height <= 0 or \
-           _dest_y_int >= self.screen_height or \
-           _dest_y_int < 0:
-            return 
-        try:
-            bitmaptools.blit(self.screen_bitmap, source_bitmap, _dest_x_int, _dest_y_int,
-                             skip_source_index=skip_index_in_source_palette)
-        except Exception as e:
-            if LIB_DEBUG_MODE: print(f"*** Errore Blit xy=({_dest_x_int},{_dest_y_int}): {e}")
-
-    def _handle_blink_animation(self, current_time):
-        if not self.is_performing_blink_anim: return
-        if current_time >= self.blink_anim_next_frame_time:
-            self.blink_anim_current_frame += 1
-            if self.blink_anim_current_frame >= self.blink_anim_frame_count:
-                self.is_performing_blink_anim = False
-                self.blink_anim_current_frame = 0 
-            else:
-                self.blink_anim_next_frame_time = current_time + self.blink_frame_duration
-    
-    def _trigger_blink(self, current_time):
-        if not self.is_performing_blink_anim: 
-            self.is_performing_blink_anim = True
-            self.blink_anim_current_frame = 0 
-            self.blink_anim_next_frame_time = current_time 
-            if LIB_DEBUG_MODE: print(f"ACTION: Blink Start @{current_time:.2f}")
-
-    def _update_state_machine(self, current_time):
-        if self.current_state != CP_STATE_DEFAULT and \
-           not self.is_performing_blink_anim and \
-           current_time >= self.state_start_time + self.state_duration:
-            self.current_state = CP_STATE_DEFAULT
-            if LIB_DEBUG_MODE: print(f"STATE -> DEFAULT @{current_time:.2f}")
-
-        if self.current_state == CP_STATE_DEFAULT and \
-           not self.is_performing_blink_anim and \
-           current_time >= self.next_state_eval_time:
-            action_eff_duration = 0.0 
-            rand_val = random.random()
-            chosen_state = None
-            if rand_val < 0.35: 
-                self._trigger_blink(current_time)
-                action_eff_duration = (self.blink_anim_frame_count -1) * self.blink_frame_duration
-            elif rand_val < 0.60: chosen_state = CP_STATE_HAPPY; self.state_duration = random.uniform(1.5, 3.0)
-            elif rand_val < 0.80: chosen_state = CP_STATE_SLEEPY; self.state_duration = random.uniform(2.0, 4.0)
-            else: chosen_state = CP_STATE_SURPRISED; self.state_duration = random.uniform(1.0, 2.0)
-            
-            if chosen_state:
-                self.current_state = chosen_state
-                self.state_start_time = current_time
-                action_eff_duration = self.state_duration
-                if LIB_DEBUG_MODE: print(f"STATE -> {self.current_state} for {self.state_duration:.1f}s")
-            self.next_state_eval_time = current_time + action_eff_duration + \
-                self._get_random_delay(self.expression_eval_interval_s, self.expression_eval_interval_variation_s)
-
-    # --- Metodi Pubblici per Controllare gli Occhi ---
-    def begin(self, width, height, frame_rate_target):
-        self.screen_width = width
-        self.screen_height = height
-
-        # Setup Palette principale (se non già fatta in init)
-        if self.screen_palette is None:
-            self.screen_palette = displayio.Palette(2)
-            self.screen_palette[CP_BGCOLOR] = 0x000000
-            self.screen_palette[CP_MAINCOLOR] = 0xFFFFFF
-        
-        # Setup Bitmap e Gruppo principale per il display
-        self.screen_bitmap = displayio.Bitmap(self.screen_width, self.screen_height, len(self.screen_palette))
-        self.screen_tile_grid = displayio.TileGrid(self.screen_bitmap, pixel_shader=self.screen_palette)
-        self.main_group = displayio.Group()
-        self.main_group.append(self.screen_tile_grid)
-        self.display_driver.root_group = self.main_group # Assegna al display fisico
-
-        self._setup_sprites() # Crea tutti gli sprite necessari
-
-        # Calcola posizioni di default
-        _total_default_width = self.base_eye_width * 2 + self.eye_default_spacing
-        self.eye_default_L_x = float((self.screen_width - _total_default_width) // 2)
-        self.eye_default_L_y = float((self.screen_height - self.base_eye_height) // 2)
-        self.eye_default_R_x = self.eye_default_L_x + self.base_eye_width + self.eye_default_spacing
-        self.eye_default_R_y = self.eye_default_L_y
-
-        self.eye_target_L_x, self.eye_target_L_y = self.eye_default_L_x, self.eye_default_L_y
-        self.eye_target_R_x, self.eye_target_R_y = self.eye_default_R_x, self.eye_default_R_y
-        self.eyeL_x, self.eyeL_y = self.eye_default_L_x, self.eye_default_L_y
-        self.eyeR_x, self.eyeR_y = self.eye_default_R_x, self.eye_default_R_y
-
-        self.next_state_eval_time = time.monotonic() + self._get_random_delay(self.expression_eval_interval_s, self.expression_eval_interval_variation_s)
-        self.idle_next_time = time.monotonic() + self._get_random_delay(self.idle_interval_s, self.idle_interval_variation_s)
-        
-        if LIB_DEBUG_MODE: print(f"RoboEyesCP begin: Screen {self.screen_width}x{self.screen_height}")
-
-
-    def update(self):
-        current_time = time.monotonic()
-        tween_factor = 0.25
-
-        self._update_state_machine(current_time)
-        if self.is_performing_blink_anim:
-            self._handle_blink_animation(current_time)
-        
-        can_idle_move = not self.is_performing_blink_anim
-        if self.current_state == CP_STATE_SURPRISED: can_idle_move = False
-        if self.current_state == CP_STATE_SLEEPY:
-             if random.random() < 0.75: can_idle_move = False # Più probabilità di stare fermo
-
-        if self.idle_active and can_idle_move and current_time >= self.idle_next_time:
-            max_ox, max_oy = self.base_eye_width // 3, self.base_eye_height // 4 
-            if self.current_state == CP_STATE_SLEEPY: max_ox //= 2; max_oy //= 2
-            rox, roy = random.uniform(-max_ox, max_ox), random.uniform(-max_oy, max_oy)
-            tlx, tly = self.eye_default_L_x + rox, self.eye_default_L_y + roy
-            mcx = EDGE_MARGIN; mcxl = self.screen_width - self.base_eye_width*2 - self.eye_default_spacing - EDGE_MARGIN
-            mcy = EDGE_MARGIN; mcyl = self.screen_height - self.base_eye_height - EDGE_MARGIN
-            self.eye_target_L_x = self._constrain(tlx, mcx, mcxl if mcxl >= mcx else mcx)
-            self.eye_target_L_y = self._constrain(tly, mcy, mcyl if mcyl >= mcy else mcy)
-            trx, try_ = self.eye_default_R_x + rox, self.eye_default_R_y + roy
-            mcrx_min = self.eye_default_L_x + self.base_eye_width + self.eye_default_spacing + EDGE_MARGIN
-            mcrx_max = self.screen_width - self.base_eye_width - EDGE_MARGIN
-            self.eye_target_R_x = self._constrain(trx, mcrx_min if mcrx_min < mcrx_max else mcrx_max -1 , mcrx_max)
-            self.eye_target_R_y = self._constrain(try_, mcy, mcyl if mcyl >= mcy else mcy) 
-            self.idle_next_time = current_time + self._get_random_delay(self.idle_interval_s, self.idle_interval_variation_s)
-
-        self.eyeL_x += (self.eye_target_L_x - self.eyeL_x) * tween_factor
-        self.eyeL_y += (self.eye_target_L_y - self.eyeL_y) * tween_factor
-        self.eyeR_x += (self.eye_target_R_x - self.eyeR_x) * tween_factor
-        self.eyeR_y += (self.eye_target_R_y - self.eyeR_y) * tween_factor
-        
-        if LIB_DEBUG_MODE and current_time - self._last_debug_print_time > 1.0: # Stampa ogni secondo
-            lx_b, ly_b = round(self.eyeL_x), round(self.eyeL_y); rx_b, ry_b = round(self.eyeR_x), round(self.eyeR_y)
-            b_fr = self.blink_anim_current_frame if self.is_performing_blink_anim else -1
-            print(f"T{current_time:.1f} L({lx_b:2},{ly_b:2}) R({rx_b:2},{ry_b:2}) St:{self.current_state[:5]} Blk:{self.is_performing_blink_anim} Fr:{b_fr}")
-            self._last_debug_print_time = current_time
-        
-        self.screen_bitmap.fill(CP_BGCOLOR)
-        
-        sprite_to_use_L = self.sprite_eye_open
-        sprite_to_use_R = self.sprite_eye_open
-
-        if self.is_performing_blink_anim:
-            frame_idx = self._constrain(self.blink_anim_current_frame, 0, self.blink_anim_frame_count - 1)
-            sprite_to_use_L = self.blink_animation_sprites[frame_idx]
-            sprite_to_use_R = self.blink_animation_sprites[frame_idx]
-        else: 
-            if self.current_state == CP_STATE_HAPPY:
-                sprite_to_use_L = self.sprite_eye_happy_form
-                sprite_to_use_R = self.sprite_eye_happy_form
-            elif self.current_state == CP_STATE_SURPRISED:
-                sprite_to_use_L = self.sprite_eye_surprised_open 
-                sprite_to_use_R = self.sprite_eye_surprised_open
-            elif self.current_state == CP_STATE_SLEEPY:
-                # Alterna per un effetto "pesante" o occhi chiusi
-                if int(current_time*1.5) % 2 == 0: # Rallenta l'alternanza per sleepy
-                     sprite_to_use_L = self.sprite_eye_sleepy_form # Era mostly_closed
-                     sprite_to_use_R = self.sprite_eye_sleepy_form
-                else: # Mantiene la linea più a lungo
-                     sprite_to_use_L = self.sprite_eye_sleepy_form # Era line, ora sleepy_form per consistenza
-                     sprite_to_use_R = self.sprite_eye_sleepy_form
-        
-        eyeL_blit_y = self.eyeL_y + (self.base_eye_height - sprite_to_use_L.height) / 2.0
-        eyeR_blit_y = self.eyeR_y + (self.base_eye_height - sprite_to_use_R.height) / 2.0
-
-        self._blit_sprite(sprite_to_use_L, self.eyeL_x, eyeL_blit_y, skip_index_in_source_palette=CP_BGCOLOR)
-        self._blit_sprite(sprite_to_use_R, self.eyeR_x, eyeR_blit_y, skip_index_in_source_palette=CP_BGCOLOR)
\ No newline at end of file
+import os
+import gc
+import time
+import random
+import json
+import math
+from array import array
+from collections import OrderedDict
+import bitmaptools
+import displayio # Necessario per i tipi displayio.Bitmap, displayio.Palette, displayio.Group
+from robo_eyes_pack import _round_rect_spans, clamp_radius, sprite_specs, read_pack_index, lid_spans
+from robo_eyes_pack import LID_ANGRY, LID_TIRED, LID_CURIOUS, LID_SHAPES
+from robo_eyes_timeline import DEFAULT_BEHAVIOUR, TRANSITION_ANIMATION, ANIMATION_BLINK, compile_behaviour, quantize_level, Timeline
+
+# --- Costanti usate dalla classe ---
+CP_BGCOLOR = 0
+CP_MAINCOLOR = 1
+
+# Stati/Espressioni (queste costanti possono essere usate anche da code.py se importate)
+CP_STATE_DEFAULT = "default"
+CP_STATE_HAPPY = "happy"
+CP_STATE_SLEEPY = "sleepy"
+CP_STATE_SURPRISED = "surprised"
+CP_STATE_ANGRY = "angry"
+CP_STATE_TIRED = "tired"
+CP_STATE_CURIOUS = "curious"
+
+CP_ACTION_BLINK = "blinking"
+
+# Backend di rendering scelto in begin()
+CP_BACKEND_BLIT = "blit" # Sprite copiati con bitmaptools.blit in un bitmap a schermo intero
+CP_BACKEND_TILEGRID = "tilegrid" # Sprite sheet + una TileGrid per occhio: cambiano solo x/y/tile
+
+# Palpebre: maschere sopra lo sprite dell'occhio, apertura quantizzata in CP_LID_LEVELS livelli
+CP_LID_ANGRY = LID_ANGRY
+CP_LID_TIRED = LID_TIRED
+CP_LID_CURIOUS = LID_CURIOUS
+CP_LID_LEVELS = 8
+
+def lid_level(amount):
+    # Quantizza la chiusura continua (0.0 aperto .. 1.0 chiuso) in un livello 0..CP_LID_LEVELS-1
+    return quantize_level(amount, CP_LID_LEVELS)
+
+# Animazioni/stati/transizioni da file JSON (vedi robo_eyes_timeline). Il percorso si può
+# cambiare in settings.toml con ROBO_EYES_ANIMS; se manca o non è valido si usa DEFAULT_BEHAVIOUR.
+CP_BEHAVIOUR_PATH = "/sd/robo_eyes_anims.json"
+
+EDGE_MARGIN = 5 
+# Geometria di riferimento (pannello 128x64): scalata agli altri pannelli da panel_layout()
+REF_PANEL_W, REF_PANEL_H = 128, 64
+REF_EYE_W, REF_EYE_H, REF_EYE_RADIUS, REF_EYE_SPACING = 36, 36, 8, 10
+CP_SPRITE_CACHE_SIZE = 16 # Numero massimo di sprite tenuti nella cache LRU
+# Pack di sprite precompilati (tools/build_sprite_pack.py). Se manca o è stale si generano a runtime.
+CP_SPRITE_PACK_PATH = "/sd/robo_eyes_sprites.bin"
+# Flag di debug specifico per questa libreria
+LIB_DEBUG_MODE = False # Imposta a True per stampe interne alla libreria
+
+# Curve di movimento degli occhi (vedi EyeMotion / set_motion)
+CP_EASE_EXPONENTIAL = "exponential"
+CP_EASE_SPRING = "spring" # Molla a smorzamento critico
+CP_EASE_LINEAR = "linear"
+CP_MOTION_HALF_LIFE_MS = 300 # Esponenziale: ~ il vecchio tween 0.25 per frame a 8 FPS
+CP_MOTION_SPRING_OMEGA = 12 # Molla: pulsazione in rad/s
+CP_MOTION_LINEAR_SPEED = 80 # Lineare: pixel al secondo
+CP_MOTION_MAX_STEP_MS = 250 # dt più lunghi vengono spezzati in passi da questa durata
+CP_MOTION_MAX_DT_MS = 2000 # Oltre questo dt (pause lunghe) il movimento è comunque concluso
+
+FP_SHIFT = 8 # Posizioni in virgola fissa Q8: 256 = 1 pixel
+FP_ONE = 1 << FP_SHIFT
+FP_HALF = FP_ONE >> 1
+
+# Coefficienti delle curve in Q16, moltiplicati a metà (8 bit alti e 8 bassi): con posizioni
+# Q8 fino a +-1024 px ogni prodotto resta sotto 2^27, negli small int di MicroPython
+# (niente long int allocati per frame), con la stessa precisione del prodotto intero
+K_SHIFT = 16
+K_ONE = 1 << K_SHIFT
+
+def _shr(n, shift):
+    # n / 2^shift troncato verso zero (>> da solo arrotonda verso -inf e non converge da sotto)
+    return n >> shift if n >= 0 else -((-n) >> shift)
+
+class EyeMotion:
+    # Motore di movimento a virgola fissa e basato sul tempo: stesse traiettorie a 8 o 60 FPS.
+    # Quattro assi (xL, yL, xR, yR) in Q8; le curve usano tabelle Q16 indicizzate dal dt in ms,
+    # calcolate una volta in configure(): nel percorso per-frame solo aritmetica intera.
+    AXES = 4
+
+    def __init__(self, curve=CP_EASE_EXPONENTIAL, rate=None):
+        self.pos = [0] * self.AXES
+        self.target = [0] * self.AXES
+        self.vel = [0] * self.AXES # Solo per la molla: velocità / pulsazione, Q8 pixel
+        self._rem = [0] * self.AXES # Solo lineare: resto (in millesimi di unità Q8) del passo precedente
+        self.snap = False # Se True chiude a target entro mezzo pixel (modalità refresh-on-change)
+        self.configure(curve, rate)
+
+    def configure(self, curve=CP_EASE_EXPONENTIAL, rate=None):
+        n = CP_MOTION_MAX_STEP_MS + 1
+        self.curve = curve
+        self._k1 = self._k2 = None
+        if curve == CP_EASE_EXPONENTIAL:
+            self.rate = CP_MOTION_HALF_LIFE_MS if rate is None else rate
+            # Al massimo K_ONE - 1: anche con half-life lunghe ogni passo avvicina al target
+            self._k1 = array("l", (min(K_ONE - 1, round(K_ONE * 0.5 ** (dt / self.rate))) for dt in range(n)))
+        elif curve == CP_EASE_SPRING:
+            self.rate = CP_MOTION_SPRING_OMEGA if rate is None else int(rate)
+            w = self.rate
+            self._k1 = array("l", (round(K_ONE * math.exp(-w * dt / 1000)) for dt in range(n)))
+            # k1 + k2 < K_ONE: anche con molle lente e dt di 1 ms ogni passo avvicina al target
+            self._k2 = array("l", (min(K_ONE - 1 - self._k1[dt], round(K_ONE * w * dt / 1000 * math.exp(-w * dt / 1000))) if dt else 0
+                                   for dt in range(n)))
+        elif curve == CP_EASE_LINEAR:
+            self.rate = CP_MOTION_LINEAR_SPEED if rate is None else rate
+            self._speed_fp = round(self.rate * FP_ONE) # Q8 pixel/s
+        else:
+            raise ValueError("curva di movimento sconosciuta: " + str(curve))
+        for i in range(self.AXES): self.vel[i] = self._rem[i] = 0
+
+    def jump(self, axis, value_fp):
+        self.pos[axis] = self.target[axis] = value_fp
+        self.vel[axis] = self._rem[axis] = 0
+
+    def _step_axis(self, i, dt):
+        d = self.pos[i] - self.target[i]
+        v = self.vel[i]
+        if d == 0 and v == 0: return
+        if self.curve == CP_EASE_EXPONENTIAL:
+            k = self._k1[dt]
+            d = _shr(d * (k >> 8) + _shr(d * (k & 0xFF), 8), 8)
+        elif self.curve == CP_EASE_SPRING:
+            # Soluzione esatta della molla critica con u = velocità / w (stessa scala di d):
+            # d' = d e^-wt + (u + d) wt e^-wt, u' = u e^-wt - (u + d) wt e^-wt
+            k1, k2 = self._k1[dt], self._k2[dt]
+            k1h, k1l, k2h, k2l = k1 >> 8, k1 & 0xFF, k2 >> 8, k2 & 0xFF
+            b = v + d
+            d, v = (_shr(d * k1h + b * k2h + _shr(d * k1l + b * k2l, 8), 8),
+                    _shr(v * k1h - b * k2h + _shr(v * k1l - b * k2l, 8), 8))
+        else:
+            # Il resto sotto l'unità Q8 passa al passo successivo: la velocità non dipende dal dt
+            step, self._rem[i] = divmod(self._rem[i] + self._speed_fp * dt, 1000)
+            if -step <= d <= step: d = self._rem[i] = 0
+            else: d = d - step if d > 0 else d + step
+        if self.snap and -FP_HALF < d < FP_HALF and -FP_HALF < v < FP_HALF: d = v = 0
+        self.pos[i] = self.target[i] + d
+        self.vel[i] = v
+
+    def step(self, dt_ms):
+        if dt_ms > CP_MOTION_MAX_DT_MS: dt_ms = CP_MOTION_MAX_DT_MS
+        while dt_ms > 0:
+            dt = CP_MOTION_MAX_STEP_MS if dt_ms > CP_MOTION_MAX_STEP_MS else dt_ms
+            for i in range(self.AXES): self._step_axis(i, dt)
+            dt_ms -= dt
+
+    def px(self, axis):
+        # Posizione intera in pixel (arrotondata)
+        return (self.pos[axis] + FP_HALF) >> FP_SHIFT
+
+    def settled(self):
+        for i in range(self.AXES):
+            if self.pos[i] != self.target[i] or self.vel[i] != 0: return False
+        return True
+
+# Tipi di evento registrati nella traccia di sessione (start_recording / replay)
+CP_EVENT_SEED = "seed"
+CP_EVENT_BEGIN = "begin"
+CP_EVENT_UPDATE = "update"
+CP_EVENT_COMMAND = "command" # look_at/set_mood/blink, per il replay
+
+# Eventi della timeline interna; il valore è anche la priorità a parità di tempo
+# (prima il frame di animazione, così uno stato rimandato a fine animazione la trova finita)
+_EV_ANIM = 0
+_EV_STATE_END = 1
+_EV_STATE_EVAL = 2
+_EV_IDLE = 3
+_EV_USER = 4
+
+class EyeLayout:
+    # Geometria degli occhi su un pannello, calcolata una volta (begin/set_layout): dimensioni
+    # sprite, posizioni di default, intervalli leciti dei target e ampiezza idle, tutti interi.
+    # Il percorso per frame legge solo questi campi.
+    def __init__(self, screen_w, screen_h, eye_w, eye_h, radius, spacing, margin=EDGE_MARGIN):
+        self.screen_w, self.screen_h = screen_w, screen_h
+        self.eye_w, self.eye_h = eye_w, eye_h
+        self.radius = clamp_radius(eye_w, eye_h, radius)
+        self.spacing, self.margin = spacing, margin
+        # Posizioni di default: coppia di occhi centrata
+        self.L_x = (screen_w - (eye_w * 2 + spacing)) // 2
+        self.L_y = self.R_y = (screen_h - eye_h) // 2
+        self.R_x = self.L_x + eye_w + spacing
+        # Spostamento lecito della coppia dalle posizioni di default (estremi inclusi): gli occhi
+        # si muovono insieme, il sinistro resta dentro il margine a sinistra e il destro a destra.
+        # Senza spazio per i margini la coppia sta ferma: centrata, o dal bordo se non entra
+        self.ox_min, self.ox_max = margin - self.L_x, screen_w - eye_w - margin - self.R_x
+        if self.ox_max < self.ox_min: self.ox_min = self.ox_max = max(0, -self.L_x)
+        self.oy_min, self.oy_max = margin - self.L_y, screen_h - eye_h - margin - self.L_y
+        if self.oy_max < self.oy_min: self.oy_min = self.oy_max = max(0, -self.L_y)
+        # Ampiezza massima del movimento idle e di look_at (-1.0..1.0)
+        self.idle_ox, self.idle_oy = eye_w // 3, eye_h // 4
+        self.look_ox, self.look_oy = (screen_w - eye_w * 2 - spacing) // 2, (screen_h - eye_h) // 2
+
+def panel_layout(screen_w, screen_h):
+    # Layout di riferimento scalato al pannello (128x32, 128x64, SPI più grandi)
+    s = min(screen_w / REF_PANEL_W, screen_h / REF_PANEL_H)
+    def sc(v): return max(1, int(v * s + 0.5))
+    return EyeLayout(screen_w, screen_h, sc(REF_EYE_W), sc(REF_EYE_H), sc(REF_EYE_RADIUS), sc(REF_EYE_SPACING), sc(EDGE_MARGIN))
+
+class SeededRandom:
+    # Generatore xorshift32 per istanza: stessa sequenza su CircuitPython e sull'host,
+    # a differenza del modulo random (CircuitPython non ha random.Random).
+    def __init__(self, seed):
+        self.seed(seed)
+
+    def seed(self, seed):
+        self._state = (int(seed) & 0xFFFFFFFF) or 0x9E3779B9 # Lo stato 0 è un punto fisso
+
+    def _next(self):
+        x = self._state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self._state = x
+        return x
+
+    def random(self):
+        return self._next() / 4294967296.0
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+class ManualClock:
+    # Orologio da far avanzare a mano: per simulazioni offline, test e replay
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, dt):
+        self.now += dt
+        return self.now
+
+def write_trace(stream, trace):
+    # Una riga JSON per evento: [tipo, tempo, argomenti...]
+    for event in trace:
+        stream.write(json.dumps(list(event)))
+        stream.write("\n")
+
+class TraceWriter:
+    # Traccia scritta sullo stream man mano (stesso formato di write_trace): sul dispositivo
+    # una sessione lunga non resta in RAM. Ha append() come la lista usata sull'host.
+    def __init__(self, stream):
+        self.stream = stream
+        self.events = 0
+
+    def append(self, event):
+        self.stream.write(json.dumps(list(event)))
+        self.stream.write("\n")
+        self.events += 1
+
+def read_trace(stream):
+    return [tuple(json.loads(line)) for line in stream if line.strip()]
+
+class SpriteCache:
+    # Cache LRU limitata degli sprite generati, indicizzata per forma e colori.
+    # Gli sprite sono condivisi: chi li riceve non deve modificarli.
+    def __init__(self, max_entries=CP_SPRITE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, builder):
+        sprite = self._entries.pop(key, None)
+        if sprite is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            sprite = builder()
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))] # Il meno usato di recente
+        self._entries[key] = sprite
+        return sprite
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+def damage_bus_bytes(rect):
+    # Byte sul bus per inviare l'area rect su un SSD1306: un byte per colonna per pagina da 8 righe
+    if rect is None: return 0
+    return (rect[2] - rect[0]) * ((rect[3] - 1) // 8 - rect[1] // 8 + 1)
+
+# Fasi misurate da FrameStats (indici in phase_ns): "state" sono gli eventi della timeline
+# (stato, animazioni), "idle" le mosse idle, "cmd" i comandi esterni (look_at/set_mood/blink)
+CP_STATS_PHASES = ("state", "idle", "tween", "clear", "blit", "refresh", "cmd")
+STATS_STATE, STATS_IDLE, STATS_TWEEN, STATS_CLEAR, STATS_BLIT, STATS_REFRESH, STATS_CMD = range(7)
+
+class FrameStats:
+    # Contatori leggeri per update() (vedi RoboEyesCP.enable_stats): tempo per fase con
+    # time.monotonic_ns, frame in ritardo/persi rispetto all'intervallo target, memoria libera
+    # e raccolte del GC. Niente print nel percorso caldo: si legge snapshot() o compact().
+    def __init__(self, target_interval_ms):
+        self.target_interval_ms = target_interval_ms
+        self._mem_free = getattr(gc, "mem_free", None) # Solo CircuitPython/MicroPython
+        self.reset()
+
+    def reset(self):
+        self.frames = 0 # Chiamate a update()
+        self.drawn = 0 # Frame effettivamente ridisegnati
+        self.late = 0 # update() arrivati oltre 1.5 intervalli target dal precedente
+        self.dropped = 0 # Intervalli target interi saltati
+        self.max_dt_ms = 0 # Massimo intervallo tra due update()
+        self.max_frame_ns = 0 # update() più lento
+        self.total_ns = 0
+        self.phase_ns = [0] * len(CP_STATS_PHASES)
+        self.blit_errors = 0
+        self.gc_runs = 0 # Stimate: la memoria libera è cresciuta tra due campioni
+        self.mem_min = None
+        self.mem_free = None
+        self._t0 = self._t = 0
+
+    def start(self):
+        self._t0 = self._t = time.monotonic_ns()
+
+    def lap(self, phase):
+        # Tempo dall'ultimo start()/lap() attribuito a phase
+        t = time.monotonic_ns()
+        self.phase_ns[phase] += t - self._t
+        self._t = t
+
+    def add(self, phase, t0):
+        self.phase_ns[phase] += time.monotonic_ns() - t0
+
+    def end(self, dt_ms, drawn, late_ms=None):
+        # late_ms: ritardo rispetto all'istante previsto (con run()); altrimenti conta dt_ms
+        elapsed = time.monotonic_ns() - self._t0
+        self.frames += 1
+        self.total_ns += elapsed
+        if elapsed > self.max_frame_ns: self.max_frame_ns = elapsed
+        if drawn: self.drawn += 1
+        if dt_ms > self.max_dt_ms: self.max_dt_ms = dt_ms
+        target = self.target_interval_ms
+        if late_ms is not None:
+            if target and 2 * late_ms > target:
+                self.late += 1
+                self.dropped += late_ms // target
+        elif target and 2 * dt_ms > 3 * target:
+            self.late += 1
+            self.dropped += dt_ms // target - 1
+        if self._mem_free is not None:
+            free = self._mem_free()
+            if self.mem_free is not None and free > self.mem_free: self.gc_runs += 1
+            self.mem_free = free
+            if self.mem_min is None or free < self.mem_min: self.mem_min = free
+
+    def snapshot(self):
+        n = self.frames or 1
+        snap = {"frames": self.frames, "drawn": self.drawn, "late": self.late, "dropped": self.dropped,
+                "max_dt_ms": self.max_dt_ms, "avg_frame_us": self.total_ns // n // 1000,
+                "max_frame_us": self.max_frame_ns // 1000, "blit_errors": self.blit_errors,
+                "mem_free": self.mem_free, "mem_min": self.mem_min, "gc_runs": self.gc_runs}
+        for name, ns in zip(CP_STATS_PHASES, self.phase_ns):
+            snap[name + "_us"] = ns // n // 1000 # Media per update()
+        return snap
+
+    def compact(self):
+        # Una riga corta per la seriale, tempi medi per update() in us
+        n = self.frames or 1
+        phases = " ".join(f"{name[:2]}={ns // n // 1000}" for name, ns in zip(CP_STATS_PHASES, self.phase_ns))
+        return (f"n={self.frames} dr={self.drawn} late={self.late} drop={self.dropped} dt^={self.max_dt_ms} "
+                f"us={self.total_ns // n // 1000} us^={self.max_frame_ns // 1000} {phases} "
+                f"free={self.mem_free} min={self.mem_min} gc={self.gc_runs} err={self.blit_errors}")
+
+class RoboEyesCP: # Il nome della classe che verrà importato
+    def __init__(self, display_driver_instance, clock=None, seed=None, sprite_cache=None, palette=None): # Accetta l'oggetto display fisico
+        self.display_driver = display_driver_instance # Salva il riferimento al display passato
+        # Orologio (callable che ritorna secondi) e RNG iniettabili: con un seed il comportamento è riproducibile
+        self._clock = clock if clock is not None else time.monotonic
+        self._rng = random if seed is None else SeededRandom(seed)
+        self.rng_seed = seed
+        self.event_trace = None # Lista o TraceWriter mentre si registra una sessione, altrimenti None
+        self.screen_width = 0 
+        self.screen_height = 0
+
+        # Palette e Bitmap principali saranno creati in begin() (la palette può arrivare condivisa)
+        self.screen_palette = palette
+        self.screen_bitmap = None
+        self.screen_tile_grid = None
+        self.main_group = None # Il gruppo che questa classe gestisce e mostra
+        self.backend = CP_BACKEND_BLIT
+        # Backend TileGrid: sprite sheet condiviso (una tile per sprite di sprite_table), una TileGrid
+        # per occhio e una per palpebra, palette con lo sfondo trasparente
+        self._sheet = None
+        self._eye_grids = None
+        self._lid_grids = [None, None]
+        self._lid_shown = [None, None]
+        self._tile_palette = None
+        self._lid_palette = None
+        self._bg_grid = None
+
+        # --- Parametri e Sprite Occhi ---
+        # Copiati dal layout in begin()/set_layout(); scalati al pannello se non impostati a mano
+        self.layout = None # EyeLayout corrente
+        self._custom_geometry = None # (w, h, raggio) da set_eye_geometry()
+        self.base_eye_width = REF_EYE_W
+        self.base_eye_height = REF_EYE_H
+        self.eye_border_radius = REF_EYE_RADIUS
+
+        # Sprite verranno creati in _setup_sprites() chiamato da begin()
+        self.sprite_eye_open = None
+        self.sprite_eye_happy_form = None
+        self.sprite_eye_sleepy_form = None
+        self.sprite_eye_line = None
+        self.sprite_eye_surprised_open = None # Può essere lo stesso di open
+        self.sprite_table = [] # Sprite base nell'ordine di sprite_specs: gli indici usati dalle tabelle compilate
+        # Cache LRU degli sprite (forme ripetute non vengono rigenerate); può essere condivisa tra istanze
+        self.sprite_cache = sprite_cache if sprite_cache is not None else SpriteCache()
+        self.sprite_pack_path = CP_SPRITE_PACK_PATH # None per generare sempre gli sprite a runtime
+        self.sprite_source = None # "pack", "procedural" o "cache", impostato da _setup_sprites()
+        self.sprite_setup_ms = 0 # Tempo speso in _setup_sprites() all'ultimo begin()
+        
+        # Palpebre di Emozione: piccole maschere (0 = palpebra, 1 = trasparente) blittate sopra
+        # lo sprite con skip_source_index, create alla prima richiesta (vedi _get_lid)
+        self._lid_masks = {}
+        self.lid_override = None # (forma, livello L, livello R) impostato da set_lids(), altrimenti per stato
+
+
+        # --- Stato Occhi (Posizione, Target) ---
+        # Posizioni disegnate (pixel interi, lette da self.motion ad ogni update)
+        self.eyeL_x, self.eyeL_y = 0, 0
+        self.eyeR_x, self.eyeR_y = 0, 0
+        self.motion = EyeMotion() # Motore di movimento in virgola fissa, basato sul tempo
+        self._last_update_time = None
+        self.eye_target_L_x, self.eye_target_L_y = 0.0, 0.0
+        self.eye_target_R_x, self.eye_target_R_y = 0.0, 0.0
+        
+        self.eye_default_spacing = REF_EYE_SPACING
+        self.eye_default_L_x = 0.0; self.eye_default_L_y = 0.0
+        self.eye_default_R_x = 0.0; self.eye_default_R_y = 0.0
+
+        # --- Sistema di Stati/Azioni ---
+        self.current_state = CP_STATE_DEFAULT
+        self.state_start_time = 0.0
+        self.state_duration = 0.0
+        self.expression_eval_interval_s = 5.0 
+        self.expression_eval_interval_variation_s = 5.0
+        self.next_state_eval_time = 0.0
+
+        # Animazioni e transizioni compilate in begin() da file (o DEFAULT_BEHAVIOUR)
+        self.behaviour_path = os.getenv("ROBO_EYES_ANIMS") or CP_BEHAVIOUR_PATH
+        self.behaviour = None
+        self._state_idx = 0 # Indice di current_state nelle tabelle compilate
+        self._anim = -1 # Animazione in corso (indice), -1 se nessuna
+        self._anim_start = 0.0
+        # Scadenze (fine stato, valutazione stato, frame di animazione, mossa idle, eventi
+        # utente) in un'unica timeline: update() guarda solo la cima quando non c'è nulla da fare
+        self.timeline = Timeline()
+        self._ev_anim = self._ev_state_end = self._ev_state_eval = self._ev_idle = None
+
+        self.is_performing_blink_anim = False # True durante un'animazione (blink o altra)
+        self.blink_anim_current_frame = 0
+
+        # --- Movimento Idle ---
+        self.idle_active = True
+        self.idle_interval_s = 2.0 
+        self.idle_interval_variation_s = 2.0
+        self.idle_next_time = 0.0
+        
+        # --- Damage tracking (rendering a rettangoli sporchi) ---
+        # Ultimo (sprite, x, y) disegnato per occhio e relativo rettangolo (x0, y0, x1, y1) sullo schermo
+        self._last_drawn_L = None; self._last_drawn_R = None
+        self._last_rect_L = None; self._last_rect_R = None
+        self._force_full_redraw = True
+        self.damage_rect = None # Unione delle aree toccate nell'ultimo frame (None se frame saltato)
+
+        # --- Refresh solo su cambiamento (vedi set_refresh_on_change) ---
+        self.refresh_on_change = False
+        self.refresh_count = 0 # display.refresh() eseguiti in questa modalità
+        self.pending_damage = None # Area cambiata e non ancora inviata al display
+        self.refresh_scheduler = None # Se impostato (RoboEyesCoordinator) decide lui quando fare refresh
+
+        self.frame_interval_ms = 0 # Da frame_rate_target in begin()
+
+        # --- Comandi esterni (look_at/set_mood/blink), applicati al prossimo update() ---
+        # Solo l'ultimo look_at/set_mood conta: una raffica di comandi costa un solo ridisegno
+        self._cmd_look = None
+        self._cmd_mood = None
+        self._cmd_blink = False
+        self._cmd_pending = False
+        self._wake = None # asyncio.Event mentre run() è attivo
+        self._due = None # Istante previsto del prossimo update() in run()
+        self.stats = None # FrameStats se attivate con enable_stats()
+        # Nota: LIB_DEBUG_MODE è globale a questo file, non self.DEBUG_MODE
+
+    def _get_random_delay(self, base, variation):
+        return base + self._rng.uniform(0, variation)
+
+    def _create_round_rect_sprite(self, width, height, radius, color_index_draw, color_index_bg, palette_to_use):
+        _w, _h, _r = int(width), int(height), int(radius)
+        _r = min(_r, _w // 2, _h // 2)
+        if _r < 0: _r = 0
+        sprite = displayio.Bitmap(_w, _h, len(palette_to_use))
+        sprite.fill(color_index_bg)
+        if _w <= 0 or _h <= 0: return sprite
+        for y0, y1, x0, x1 in _round_rect_spans(_w, _h, _r):
+            bitmaptools.fill_region(sprite, x0, y0, x1, y1, color_index_draw)
+        return sprite
+
+    def _get_round_rect_sprite(self, width, height, radius, color_index_draw, color_index_bg, palette_to_use, builder=None):
+        # Come _create_round_rect_sprite ma passando dalla cache: forme uguali condividono il bitmap
+        _w, _h = int(width), int(height)
+        _r = clamp_radius(_w, _h, radius)
+        key = (_w, _h, _r, color_index_draw, color_index_bg, len(palette_to_use))
+        if builder is None:
+            builder = lambda: self._create_round_rect_sprite(_w, _h, _r, color_index_draw, color_index_bg, palette_to_use)
+        return self.sprite_cache.get(key, builder)
+
+    def _load_sprite_pack(self, path):
+        # Legge gli sprite base dal pack precompilato; None se manca, è corrotto o è per un'altra geometria
+        try:
+            with open(path, "rb") as f:
+                index = read_pack_index(f, self.base_eye_width, self.base_eye_height, self.eye_border_radius)
+                if index is None:
+                    if LIB_DEBUG_MODE: print(f"Sprite pack {path} stale o non valido")
+                    return None
+                sprites = []
+                for w, h, offset in index:
+                    sprite = displayio.Bitmap(w, h, len(self.screen_palette))
+                    f.seek(offset)
+                    bitmaptools.readinto(sprite, f, 1) # 1 bpp, MSB a sinistra, righe allineate al byte
+                    sprites.append(sprite)
+                return sprites
+        except Exception as e: # OSError se il file non c'è, ValueError/EOFError se troncato
+            if LIB_DEBUG_MODE: print(f"Sprite pack {path} non caricato: {e}")
+            return None
+
+    def _setup_sprites(self):
+        t0 = time.monotonic()
+        specs = sprite_specs(self.base_eye_width, self.base_eye_height, self.eye_border_radius)
+        # Il pack serve solo se qualche forma non è già in cache
+        missing = False
+        for _, w, h, r in specs:
+            if (w, h, r, CP_MAINCOLOR, CP_BGCOLOR, len(self.screen_palette)) not in self.sprite_cache: missing = True
+        packed = self._load_sprite_pack(self.sprite_pack_path) if missing and self.sprite_pack_path else None
+        sprites = {}
+        for i, (name, w, h, r) in enumerate(specs):
+            builder = (lambda b=packed[i]: b) if packed else None
+            sprites[name] = self._get_round_rect_sprite(w, h, r, CP_MAINCOLOR, CP_BGCOLOR, self.screen_palette, builder)
+        self.sprite_source = "pack" if packed else "procedural" if missing else "cache"
+
+        # Sprite Principali
+        self.sprite_eye_open = sprites["open"]
+        self.sprite_eye_happy_form = sprites["happy"]
+        self.sprite_eye_sleepy_form = sprites["sleepy"] # Usato anche come "chiuso" nel blink
+        self.sprite_eye_surprised_open = self.sprite_eye_open 
+        self.sprite_table = [sprites[name] for name, _, _, _ in specs]
+        self.sprite_setup_ms = int((time.monotonic() - t0) * 1000)
+
+
+    def _create_lid_mask(self, kind, w, depth, mirror):
+        mask = displayio.Bitmap(w, depth, len(self.screen_palette))
+        mask.fill(CP_MAINCOLOR) # Indice saltato nel blit: lascia l'occhio com'è
+        for y, x0, x1 in lid_spans(kind, w, depth, mirror):
+            bitmaptools.fill_region(mask, x0, y, x1, y + 1, CP_BGCOLOR)
+        return mask
+
+    def _get_lid(self, kind, level, mirror, sprite):
+        # Maschera per (forma, livello, lato, dimensioni sprite); tabella riempita solo quando serve
+        key = (kind, level, mirror, sprite.width, sprite.height)
+        mask = self._lid_masks.get(key)
+        if mask is None:
+            depth = (level * sprite.height + (CP_LID_LEVELS - 1) // 2) // (CP_LID_LEVELS - 1)
+            if depth <= 0: return None
+            w = sprite.width
+            mask = self.sprite_cache.get(("lid", kind, mirror, w, depth, len(self.screen_palette)),
+                                         lambda: self._create_lid_mask(kind, w, depth, mirror))
+            self._lid_masks[key] = mask
+        return mask
+
+    def _blit_sprite(self, source_bitmap, dest_x, dest_y, skip_index_in_source_palette=None):
+        _dest_x_int = round(dest_x); _dest_y_int = round(dest_y)
+        if _dest_x_int + source_bitmap.width <= 0 or \
+           _dest_x_int >= self.screen_width or \
+           _dest_y_int + source_bitmap.height <= 0 or \
+           _dest_y_int >= self.screen_height or \
+           _dest_y_int < 0:
+            return 
+        s = self.stats
+        if s is not None: t0 = time.monotonic_ns()
+        try:
+            bitmaptools.blit(self.screen_bitmap, source_bitmap, _dest_x_int, _dest_y_int,
+                             skip_source_index=skip_index_in_source_palette)
+        except Exception:
+            if s is not None: s.blit_errors += 1
+        if s is not None: s.add(STATS_BLIT, t0)
+
+    def _eye_rect(self, sprite, x, y):
+        # Rettangolo effettivamente scritto da un blit in (x, y), None se il blit verrebbe scartato
+        if x < 0 or y < 0 or x >= self.screen_width or y >= self.screen_height: return None
+        return (x, y, min(x + sprite.width, self.screen_width), min(y + sprite.height, self.screen_height))
+
+    def _add_damage(self, rect):
+        d = self.damage_rect
+        if d is None: self.damage_rect = rect
+        else: self.damage_rect = (min(d[0], rect[0]), min(d[1], rect[1]), max(d[2], rect[2]), max(d[3], rect[3]))
+
+    def _clear_rect(self, x0, y0, x1, y1):
+        if x1 > x0 and y1 > y0:
+            s = self.stats
+            if s is not None: t0 = time.monotonic_ns()
+            bitmaptools.fill_region(self.screen_bitmap, x0, y0, x1, y1, CP_BGCOLOR)
+            if s is not None: s.add(STATS_CLEAR, t0)
+            self._add_damage((x0, y0, x1, y1))
+
+    def _clear_uncovered(self, old, new):
+        # Pulisce solo le strisce del vecchio rettangolo che il nuovo non ricopre
+        if old is None: return
+        if new is None or old[0] >= new[2] or new[0] >= old[2] or old[1] >= new[3] or new[1] >= old[3]:
+            self._clear_rect(*old); return
+        ox0, oy0, ox1, oy1 = old; nx0, ny0, nx1, ny1 = new
+        self._clear_rect(ox0, oy0, ox1, ny0) # Sopra
+        self._clear_rect(ox0, ny1, ox1, oy1) # Sotto
+        my0, my1 = max(oy0, ny0), min(oy1, ny1)
+        self._clear_rect(ox0, my0, nx0, my1) # Sinistra
+        self._clear_rect(nx1, my0, ox1, my1) # Destra
+
+    @staticmethod
+    def _rects_touch(a, b):
+        return a is not None and b is not None and a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+    def _render_eyes(self, sprite_L, lx, ly, sprite_R, rx, ry, lid_L=None, lid_R=None):
+        # Ridisegna solo ciò che è cambiato; ritorna False se il frame è identico al precedente
+        new_L = (sprite_L, lx, ly, lid_L); new_R = (sprite_R, rx, ry, lid_R)
+        if not self._force_full_redraw and new_L == self._last_drawn_L and new_R == self._last_drawn_R:
+            self.damage_rect = None
+            return False
+        self.damage_rect = None
+        rect_L = self._eye_rect(sprite_L, lx, ly); rect_R = self._eye_rect(sprite_R, rx, ry)
+        old_L, old_R = self._last_rect_L, self._last_rect_R
+        overlap = False
+        for a in (rect_L, old_L):
+            for b in (rect_R, old_R):
+                if self._rects_touch(a, b): overlap = True
+        if self._force_full_redraw or overlap:
+            # Occhi sovrapposti (o primo frame): clear completo e blit con trasparenza
+            s = self.stats
+            if s is not None: t0 = time.monotonic_ns()
+            self.screen_bitmap.fill(CP_BGCOLOR)
+            if s is not None: s.add(STATS_CLEAR, t0)
+            self._add_damage((0, 0, self.screen_width, self.screen_height))
+            self._blit_sprite(sprite_L, lx, ly, skip_index_in_source_palette=CP_BGCOLOR)
+            self._blit_sprite(sprite_R, rx, ry, skip_index_in_source_palette=CP_BGCOLOR)
+            if lid_L is not None: self._blit_sprite(lid_L, lx, ly, skip_index_in_source_palette=CP_MAINCOLOR)
+            if lid_R is not None: self._blit_sprite(lid_R, rx, ry, skip_index_in_source_palette=CP_MAINCOLOR)
+        else:
+            # Occhi disgiunti: il blit opaco ripulisce anche gli angoli, basta pulire le strisce scoperte
+            if new_L != self._last_drawn_L:
+                self._clear_uncovered(old_L, rect_L)
+                if rect_L is not None:
+                    self._blit_sprite(sprite_L, lx, ly); self._add_damage(rect_L)
+                    if lid_L is not None: self._blit_sprite(lid_L, lx, ly, skip_index_in_source_palette=CP_MAINCOLOR)
+            if new_R != self._last_drawn_R:
+                self._clear_uncovered(old_R, rect_R)
+                if rect_R is not None:
+                    self._blit_sprite(sprite_R, rx, ry); self._add_damage(rect_R)
+                    if lid_R is not None: self._blit_sprite(lid_R, rx, ry, skip_index_in_source_palette=CP_MAINCOLOR)
+        self._last_drawn_L, self._last_drawn_R = new_L, new_R
+        self._last_rect_L, self._last_rect_R = rect_L, rect_R
+        self._force_full_redraw = False
+        return True
+
+    def _copy_palette(self, transparent):
+        pal = displayio.Palette(len(self.screen_palette))
+        for i in range(len(pal)): pal[i] = self.screen_palette[i]
+        pal.make_transparent(transparent)
+        return pal
+
+    def _build_sprite_sheet(self):
+        # Una tile eye_w x eye_h per sprite di sprite_table, sprite centrato in verticale come nel blit
+        w, h = self.base_eye_width, self.base_eye_height
+        sheet = displayio.Bitmap(w * len(self.sprite_table), h, len(self.screen_palette))
+        for i, sprite in enumerate(self.sprite_table):
+            bitmaptools.blit(sheet, sprite, i * w, (h - sprite.height) >> 1)
+        return sheet
+
+    def _setup_tile_grids(self):
+        # (Ri)crea sprite sheet e TileGrid per la geometria corrente
+        g = self.main_group
+        while len(g): g.pop()
+        if self._tile_palette is None:
+            self._tile_palette = self._copy_palette(CP_BGCOLOR)
+            self._lid_palette = self._copy_palette(CP_MAINCOLOR)
+            if self.screen_palette[CP_BGCOLOR]: # Sfondo non nero: serve un livello pieno sotto gli occhi
+                bg = displayio.Bitmap(self.screen_width, self.screen_height, len(self.screen_palette))
+                bg.fill(CP_BGCOLOR)
+                self._bg_grid = displayio.TileGrid(bg, pixel_shader=self.screen_palette)
+            else:
+                self._bg_grid = None
+        if self._bg_grid is not None: g.append(self._bg_grid)
+        w, h = self.base_eye_width, self.base_eye_height
+        self._sheet = self.sprite_cache.get(("sheet", w, h, self.eye_border_radius, len(self.screen_palette)),
+                                            self._build_sprite_sheet)
+        self._eye_grids = []
+        for _ in range(2):
+            grid = displayio.TileGrid(self._sheet, pixel_shader=self._tile_palette, tile_width=w, tile_height=h)
+            grid.hidden = True # Visibile dal primo update()
+            g.append(grid)
+            self._eye_grids.append(grid)
+        self._lid_grids = [None, None]
+        self._lid_shown = [None, None]
+
+    def _tile_rect(self, x, y):
+        # Area dello schermo coperta dalla tile di un occhio in (x, y), None se fuori
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + self.base_eye_width, self.screen_width), min(y + self.base_eye_height, self.screen_height)
+        return (x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None
+
+    def _set_lid_grid(self, side, mask, x, y):
+        grid = self._lid_grids[side]
+        if mask is None:
+            if grid is not None: grid.hidden = True
+            return
+        if mask is not self._lid_shown[side]:
+            # Il bitmap di una TileGrid non si cambia: nuova TileGrid al posto della vecchia
+            new = displayio.TileGrid(mask, pixel_shader=self._lid_palette)
+            if grid is None: self.main_group.append(new)
+            else: self.main_group[self.main_group.index(grid)] = new
+            self._lid_grids[side] = grid = new
+            self._lid_shown[side] = mask
+        grid.x = x; grid.y = y; grid.hidden = False
+
+    def _render_tiles(self, idx_L, lx, ly, idx_R, rx, ry, lid_L=None, lid_R=None):
+        # Backend TileGrid: nessun pixel copiato, solo posizione/tile delle TileGrid.
+        # (lx, ly) è l'angolo della tile (occhio a piena altezza); damage_rect resta una stima
+        # per refresh e budget del bus, l'area sporca vera la calcola displayio.
+        new_L = (idx_L, lx, ly, lid_L); new_R = (idx_R, rx, ry, lid_R)
+        force = self._force_full_redraw
+        if not force and new_L == self._last_drawn_L and new_R == self._last_drawn_R:
+            self.damage_rect = None
+            return False
+        self.damage_rect = None
+        for side, new, old in ((0, new_L, self._last_drawn_L), (1, new_R, self._last_drawn_R)):
+            if not force and new == old: continue
+            idx, x, y, lid = new
+            if old is not None:
+                r = self._tile_rect(old[1], old[2])
+                if r is not None: self._add_damage(r)
+            r = self._tile_rect(x, y)
+            if r is not None: self._add_damage(r)
+            grid = self._eye_grids[side]
+            grid.x = x; grid.y = y; grid[0] = idx; grid.hidden = False
+            self._set_lid_grid(side, lid, x, y + ((self.base_eye_height - self.sprite_table[idx].height) >> 1))
+        self._last_drawn_L, self._last_drawn_R = new_L, new_R
+        self._force_full_redraw = False
+        return True
+
+    def _apply_targets(self):
+        # Passa i target (pixel, anche frazionari) al motore di movimento
+        m = self.motion
+        m.target[0] = int(self.eye_target_L_x * FP_ONE); m.target[1] = int(self.eye_target_L_y * FP_ONE)
+        m.target[2] = int(self.eye_target_R_x * FP_ONE); m.target[3] = int(self.eye_target_R_y * FP_ONE)
+
+    def is_settled(self):
+        # True se gli occhi sono fermi sul target e non c'è un blink in corso
+        return not self.is_performing_blink_anim and self.motion.settled()
+
+    def _load_behaviour(self):
+        # Compila animazioni e comportamento dal file JSON, o quelli di default
+        names = [name for name, _, _, _ in sprite_specs(self.base_eye_width, self.base_eye_height, self.eye_border_radius)]
+        if self.behaviour_path:
+            try:
+                with open(self.behaviour_path, "r") as f:
+                    return compile_behaviour(json.load(f), names, CP_LID_LEVELS)
+            except Exception as e: # OSError se il file non c'è, ValueError/KeyError se non è valido
+                if LIB_DEBUG_MODE: print(f"Animazioni {self.behaviour_path} non caricate: {e}")
+        return compile_behaviour(DEFAULT_BEHAVIOUR, names, CP_LID_LEVELS)
+
+    def _handle_animation(self, frame):
+        # Evento di fine frame: passa al frame successivo (l'argomento dell'evento). Il prossimo
+        # evento è al tempo di fine previsto del frame, sempre dopo questo: niente tempi del
+        # frame arrotondati, che potevano riprogrammare lo stesso frame all'infinito
+        if not self.is_performing_blink_anim: return
+        ends = self.behaviour.anim_ends[self._anim]
+        if frame >= len(ends):
+            self.is_performing_blink_anim = False
+            self.blink_anim_current_frame = 0
+            self._anim = -1
+            self._ev_anim = None
+        else:
+            self.blink_anim_current_frame = frame
+            self._ev_anim = self.timeline.schedule(self._anim_start + ends[frame] / 1000, _EV_ANIM, frame + 1, priority=_EV_ANIM)
+
+    def _start_animation(self, anim, current_time):
+        if not self.is_performing_blink_anim: 
+            self.is_performing_blink_anim = True
+            self._anim = anim
+            self._anim_start = current_time
+            self.blink_anim_current_frame = 0 
+            self._ev_anim = self.timeline.schedule(current_time + self.behaviour.anim_ends[anim][0] / 1000, _EV_ANIM, 1, priority=_EV_ANIM)
+            if LIB_DEBUG_MODE: print(f"ACTION: {self.behaviour.animation_names[anim]} Start @{current_time:.2f}")
+
+    def _animation_end(self):
+        return self._anim_start + self.behaviour.duration_ms(self._anim) / 1000
+
+    def _trigger_blink(self, current_time):
+        self._start_animation(self.behaviour.animation(ANIMATION_BLINK), current_time)
+
+    def _set_state(self, idx, current_time, duration=0.0):
+        # Entra nello stato idx; fuori da default programma la fine dopo duration secondi
+        self._state_idx = idx
+        self.current_state = self.behaviour.state_names[idx]
+        self.state_start_time = current_time
+        self.state_duration = duration
+        self.timeline.cancel(self._ev_state_end)
+        self._ev_state_end = None if idx == 0 else self.timeline.schedule(current_time + duration, _EV_STATE_END, priority=_EV_STATE_END)
+
+    def _schedule_state_eval(self, t):
+        self.next_state_eval_time = t
+        self.timeline.cancel(self._ev_state_eval)
+        self._ev_state_eval = self.timeline.schedule(t, _EV_STATE_EVAL, priority=_EV_STATE_EVAL)
+
+    def _schedule_idle(self, t):
+        # Se l'evento in coda arriva prima di t lo si tiene: _on_idle lo rimanda a idle_next_time.
+        # Così un look_at a raffica non riempie la timeline di eventi cancellati
+        self.idle_next_time = t
+        queued = self.timeline.pending_time(self._ev_idle)
+        if queued is not None and queued <= t: return
+        self.timeline.cancel(self._ev_idle)
+        self._ev_idle = self.timeline.schedule(t, _EV_IDLE, priority=_EV_IDLE)
+
+    def _on_state_end(self, current_time):
+        self._ev_state_end = None
+        if self.is_performing_blink_anim: # Mai a metà animazione: si torna a default alla fine
+            self._ev_state_end = self.timeline.schedule(self._animation_end(), _EV_STATE_END, priority=_EV_STATE_END)
+            return
+        self._set_state(0, current_time)
+        if LIB_DEBUG_MODE: print(f"STATE -> DEFAULT @{current_time:.2f}")
+
+    def _on_state_eval(self, current_time):
+        self._ev_state_eval = None
+        tbl = self.behaviour
+        if self.is_performing_blink_anim:
+            self._schedule_state_eval(self._animation_end()); return
+        if self._state_idx != 0: # Es. stato impostato da set_mood(): si valuta quando finisce
+            self._schedule_state_eval(self.state_start_time + self.state_duration); return
+        # Transizione pesata: una bisect sui pesi cumulativi
+        t = tbl.pick_transition(self._rng.random())
+        target = tbl.trans_target[t]
+        if tbl.trans_kind[t] == TRANSITION_ANIMATION:
+            self._start_animation(target, current_time)
+            action_eff_duration = tbl.duration_ms(target) / 1000
+        else:
+            self._set_state(target, current_time, self._rng.uniform(tbl.state_min_ms[target], tbl.state_max_ms[target]) / 1000)
+            action_eff_duration = self.state_duration
+            if LIB_DEBUG_MODE: print(f"STATE -> {self.current_state} for {self.state_duration:.1f}s")
+        self._schedule_state_eval(current_time + action_eff_duration +
+                                  self._get_random_delay(self.expression_eval_interval_s, self.expression_eval_interval_variation_s))
+
+    def _on_idle(self, current_time):
+        self._ev_idle = None
+        if current_time < self.idle_next_time: # Rimandato da un look_at dopo che era in coda
+            self._schedule_idle(self.idle_next_time); return
+        if self.is_performing_blink_anim:
+            self._schedule_idle(self._animation_end()); return
+        tbl = self.behaviour
+        st = self._state_idx
+        # Una sola estrazione per mossa programmata (es. sleepy: 25% di probabilità di muoversi)
+        idle_chance = tbl.state_idle_chance[st]
+        if self.idle_active and idle_chance and (idle_chance >= 100 or self._rng.random() * 100 < idle_chance):
+            max_ox, max_oy = self.layout.idle_ox, self.layout.idle_oy
+            idle_scale = tbl.state_idle_scale[st]
+            if idle_scale != 100: max_ox = max_ox * idle_scale // 100; max_oy = max_oy * idle_scale // 100
+            self._set_gaze(self._rng.uniform(-max_ox, max_ox), self._rng.uniform(-max_oy, max_oy))
+        self._schedule_idle(current_time + self._get_random_delay(self.idle_interval_s, self.idle_interval_variation_s))
+
+    def _run_events(self, current_time):
+        # Esegue in ordine tutti gli eventi scaduti. Gli eventi successivi partono dal tempo
+        # previsto dell'evento, non da quello del frame: la sequenza (e l'uso dell'RNG) non
+        # dipende dal frame rate
+        tl = self.timeline
+        while True:
+            event = tl.pop_due(current_time)
+            if event is None: return
+            t, kind = event[0], event[1]
+            if kind == _EV_ANIM: self._handle_animation(event[2])
+            elif kind == _EV_STATE_END: self._on_state_end(t)
+            elif kind == _EV_STATE_EVAL: self._on_state_eval(t)
+            elif kind == _EV_IDLE:
+                s = self.stats
+                if s is not None: s.lap(STATS_STATE)
+                self._on_idle(t)
+                if s is not None: s.lap(STATS_IDLE)
+            else: event[2](self) # Evento utente: callback(eyes)
+
+    def _setup_default_positions(self):
+        L = self.layout
+        self.eye_default_L_x = float(L.L_x); self.eye_default_L_y = float(L.L_y)
+        self.eye_default_R_x = float(L.R_x); self.eye_default_R_y = float(L.R_y)
+
+        self.eye_target_L_x, self.eye_target_L_y = self.eye_default_L_x, self.eye_default_L_y
+        self.eye_target_R_x, self.eye_target_R_y = self.eye_default_R_x, self.eye_default_R_y
+        m = self.motion
+        m.jump(0, int(self.eye_default_L_x) << FP_SHIFT); m.jump(1, int(self.eye_default_L_y) << FP_SHIFT)
+        m.jump(2, int(self.eye_default_R_x) << FP_SHIFT); m.jump(3, int(self.eye_default_R_y) << FP_SHIFT)
+        self.eyeL_x, self.eyeL_y, self.eyeR_x, self.eyeR_y = m.px(0), m.px(1), m.px(2), m.px(3)
+
+    def _set_gaze(self, rox, roy):
+        # Sposta i target di (rox, roy) pixel dalle posizioni di default: lo spostamento è limitato
+        # una volta sola per la coppia, così gli occhi restano alla distanza di default
+        L = self.layout
+        rox = max(L.ox_min, min(rox, L.ox_max)); roy = max(L.oy_min, min(roy, L.oy_max))
+        self.eye_target_L_x = L.L_x + rox; self.eye_target_L_y = L.L_y + roy
+        self.eye_target_R_x = L.R_x + rox; self.eye_target_R_y = L.R_y + roy
+        self._apply_targets()
+
+    def _apply_commands(self, current_time):
+        look, mood, blink = self._cmd_look, self._cmd_mood, self._cmd_blink
+        self._cmd_look = self._cmd_mood = None; self._cmd_blink = self._cmd_pending = False
+        if mood is not None:
+            idx = self.behaviour.state_index[mood]
+            self._set_state(idx, current_time, self._rng.uniform(self.behaviour.state_min_ms[idx], self.behaviour.state_max_ms[idx]) / 1000)
+        if look is not None:
+            # Lo sguardo resta fermo per un intervallo idle prima che riparta il movimento casuale
+            self._set_gaze(look[0] * self.layout.look_ox, look[1] * self.layout.look_oy)
+            self._schedule_idle(current_time + self._get_random_delay(self.idle_interval_s, self.idle_interval_variation_s))
+        if blink: self._trigger_blink(current_time)
+
+    def _post_command(self, *event):
+        if self.event_trace is not None: self.event_trace.append((CP_EVENT_COMMAND, self._clock()) + event)
+        self._cmd_pending = True
+        if self._wake is not None: self._wake.set() # Sveglia run() subito
+
+    # --- Metodi Pubblici per Controllare gli Occhi ---
+    def look_at(self, x, y):
+        # Guarda verso (x, y), da -1.0 (sinistra/alto) a 1.0 (destra/basso). Non bloccante:
+        # applicato al prossimo update(), le chiamate ravvicinate si fondono nell'ultima
+        self._cmd_look = (max(-1.0, min(1.0, x)), max(-1.0, min(1.0, y)))
+        self._post_command("look_at", x, y)
+
+    def set_mood(self, state):
+        # Passa allo stato state (CP_STATE_*) per la durata prevista dalle animazioni; non bloccante
+        if self.behaviour is not None and state not in self.behaviour.state_index: raise ValueError("stato sconosciuto: " + str(state))
+        self._cmd_mood = state
+        self._post_command("set_mood", state)
+
+    def blink(self):
+        self._cmd_blink = True
+        self._post_command("blink")
+
+    def schedule(self, delay_s, callback):
+        # Evento utente sulla timeline: callback(eyes) chiamato da update() dopo delay_s secondi.
+        # Ritorna un token per cancel(). Non finisce nelle tracce di start_recording().
+        if self._wake is not None: self._wake.set() # run() ricalcola l'attesa
+        return self.timeline.schedule(self._clock() + delay_s, _EV_USER, callback, priority=_EV_USER)
+
+    def cancel(self, token):
+        self.timeline.cancel(token)
+
+    def set_eye_geometry(self, width, height, radius):
+        # Dimensione/raggio degli occhi fissati a mano (niente scala automatica al pannello)
+        self._custom_geometry = (int(width), int(height), int(radius))
+        if self.main_group is None: return # begin() non ancora chiamato: basta salvare i parametri
+        self.set_layout(self._make_layout())
+
+    def _make_layout(self):
+        if self._custom_geometry is None: return panel_layout(self.screen_width, self.screen_height)
+        w, h, r = self._custom_geometry
+        return EyeLayout(self.screen_width, self.screen_height, w, h, r, self.eye_default_spacing)
+
+    def set_layout(self, layout):
+        # Cambia layout a runtime in un passo: sprite (forme già viste arrivano dalla cache),
+        # TileGrid, posizioni di default e limiti dei target
+        self.layout = layout
+        self.base_eye_width, self.base_eye_height, self.eye_border_radius = layout.eye_w, layout.eye_h, layout.radius
+        self.eye_default_spacing = layout.spacing
+        if self.main_group is None: return
+        self._setup_sprites()
+        self._lid_masks = {}
+        if self.backend == CP_BACKEND_TILEGRID: self._setup_tile_grids()
+        self._setup_default_positions()
+        self._force_full_redraw = True
+
+    def set_refresh_on_change(self, enabled=True):
+        # Modalità a refresh manuale: auto_refresh spento, display.refresh() solo quando
+        # update() produce un frame diverso, tween chiuso entro mezzo pixel dal target
+        self.refresh_on_change = enabled
+        self.motion.snap = enabled
+        self.display_driver.auto_refresh = not enabled
+        if enabled and self.main_group is not None:
+            self._force_full_redraw = True # Il primo frame in questa modalità va sempre inviato
+
+    def flush_refresh(self):
+        # Invia al display le modifiche accumulate; ritorna i byte stimati sul bus
+        if self.pending_damage is None: return 0
+        cost = damage_bus_bytes(self.pending_damage)
+        self.pending_damage = None
+        s = self.stats
+        if s is not None: t0 = time.monotonic_ns()
+        self.display_driver.refresh()
+        if s is not None: s.add(STATS_REFRESH, t0)
+        self.refresh_count += 1
+        return cost
+
+    def set_lids(self, kind=None, amount=0.5, amount_right=None):
+        # Palpebre manuali (CP_LID_ANGRY/TIRED/CURIOUS), chiusura 0.0-1.0 quantizzata;
+        # kind=None torna alle palpebre decise dallo stato corrente
+        if kind is None:
+            self.lid_override = None
+            return
+        if kind not in LID_SHAPES: raise ValueError("palpebra sconosciuta: " + str(kind))
+        lvl = lid_level(amount)
+        self.lid_override = (kind, lvl, lvl if amount_right is None else lid_level(amount_right))
+
+    def enable_stats(self, enabled=True, target_fps=None):
+        # Strumentazione di update() (vedi FrameStats); target_fps di default quello di begin()
+        if not enabled:
+            self.stats = None
+            return
+        self.stats = FrameStats(1000 // target_fps if target_fps else self.frame_interval_ms)
+
+    def stats_snapshot(self, reset=False):
+        # Dizionario con i contatori correnti (None se le statistiche sono spente)
+        s = self.stats
+        if s is None: return None
+        snap = s.snapshot()
+        if reset: s.reset()
+        return snap
+
+    def set_motion(self, curve=CP_EASE_EXPONENTIAL, rate=None):
+        # Curva di movimento: CP_EASE_EXPONENTIAL (rate = half-life in ms), CP_EASE_SPRING
+        # (rate = pulsazione rad/s, smorzamento critico) o CP_EASE_LINEAR (rate = pixel/s)
+        self.motion.configure(curve, rate)
+
+    def seed(self, seed):
+        # Passa a un RNG deterministico per questa istanza
+        self.rng_seed = seed
+        self._rng = SeededRandom(seed)
+
+    def start_recording(self, stream=None):
+        # Registra seed, begin() e ogni update() con il loro tempo: la traccia basta per replay().
+        # Con stream (file aperto in scrittura, es. su /sd) gli eventi vengono scritti subito,
+        # una riga JSON ciascuno (rileggibili con read_trace); senza, restano in una lista (host).
+        # Va chiamato prima di begin(): dopo, la traccia non avrebbe begin() e il seed cambierebbe a metà
+        if self.main_group is not None: raise ValueError("start_recording() va chiamato prima di begin()")
+        if self.rng_seed is None: self.seed(random.randint(1, 0x3FFFFFFF))
+        self.event_trace = [] if stream is None else TraceWriter(stream)
+        self.event_trace.append((CP_EVENT_SEED, 0.0, self.rng_seed))
+        return self.event_trace
+
+    def stop_recording(self):
+        # La lista degli eventi, o il TraceWriter (stream già svuotato con flush, da chiudere)
+        trace, self.event_trace = self.event_trace, None
+        if isinstance(trace, TraceWriter): trace.stream.flush()
+        return trace
+
+    def snapshot(self, drawn=None):
+        # (tempo, stato, frame blink o -1, xL, yL, xR, yR, disegnato) dell'ultimo update()
+        return (self._clock(), self.current_state,
+                self.blink_anim_current_frame if self.is_performing_blink_anim else -1,
+                self.eyeL_x, self.eyeL_y, self.eyeR_x, self.eyeR_y, drawn)
+
+    def frame(self):
+        # Il frame composto: screen_bitmap col backend blit, main_group col backend TileGrid
+        return self.main_group if self.screen_bitmap is None else self.screen_bitmap
+
+    def render_frames(self, n, dt, frames=False):
+        # Avanza la simulazione di n passi da dt secondi senza dormire. Genera uno snapshot()
+        # per passo, oppure frame() (lo stesso oggetto, aggiornato) se frames=True.
+        clock = self._clock
+        if not isinstance(clock, ManualClock):
+            self._clock = ManualClock(clock()) # Tempo virtuale che parte da adesso
+        try:
+            for _ in range(n):
+                drawn = self.update()
+                yield self.frame() if frames else self.snapshot(drawn)
+                self._clock.advance(dt)
+        finally:
+            if self._clock is not clock:
+                self._clock = clock
+
+    def replay(self, trace, frames=False):
+        # Riesegue una traccia di start_recording() su questa istanza (anche su un altro
+        # dispositivo o sull'host), con lo stesso seed e gli stessi tempi
+        clock = self._clock
+        self._clock = ManualClock()
+        try:
+            for event in trace:
+                kind, t = event[0], event[1]
+                self._clock.now = t
+                if kind == CP_EVENT_SEED: self.seed(event[2])
+                elif kind == CP_EVENT_BEGIN: self.begin(*event[2:])
+                elif kind == CP_EVENT_COMMAND: getattr(self, event[2])(*event[3:]) # look_at/set_mood/blink
+                elif kind == CP_EVENT_UPDATE:
+                    drawn = self.update()
+                    yield self.frame() if frames else self.snapshot(drawn)
+        finally:
+            self._clock = clock
+
+    def begin(self, width, height, frame_rate_target, backend=CP_BACKEND_BLIT):
+        # backend: CP_BACKEND_BLIT (default) o CP_BACKEND_TILEGRID (vedi _render_tiles)
+        if backend not in (CP_BACKEND_BLIT, CP_BACKEND_TILEGRID): raise ValueError("backend sconosciuto: " + str(backend))
+        if self.event_trace is not None: self.event_trace.append((CP_EVENT_BEGIN, self._clock(), width, height, frame_rate_target, backend))
+        self.screen_width = width
+        self.screen_height = height
+        self.frame_interval_ms = 1000 // frame_rate_target if frame_rate_target else 0
+        if self.stats is not None and not self.stats.target_interval_ms: self.stats.target_interval_ms = self.frame_interval_ms
+
+        # Setup Palette principale (se non già fatta in init)
+        if self.screen_palette is None:
+            self.screen_palette = displayio.Palette(2)
+            self.screen_palette[CP_BGCOLOR] = 0x000000
+            self.screen_palette[CP_MAINCOLOR] = 0xFFFFFF
+        
+        # Setup Bitmap e Gruppo principale per il display
+        self.backend = backend
+        self.main_group = displayio.Group()
+        if backend == CP_BACKEND_TILEGRID:
+            self.screen_bitmap = self.screen_tile_grid = None # Niente bitmap a schermo intero
+        else:
+            self.screen_bitmap = displayio.Bitmap(self.screen_width, self.screen_height, len(self.screen_palette))
+            self.screen_tile_grid = displayio.TileGrid(self.screen_bitmap, pixel_shader=self.screen_palette)
+            self.main_group.append(self.screen_tile_grid)
+            self._eye_grids = None
+        self.display_driver.root_group = self.main_group # Assegna al display fisico
+        self._last_update_time = None
+        self._last_drawn_L = self._last_drawn_R = None
+        self._last_rect_L = self._last_rect_R = None
+        self._force_full_redraw = True
+
+        self.layout = self._make_layout()
+        self.base_eye_width, self.base_eye_height, self.eye_border_radius = self.layout.eye_w, self.layout.eye_h, self.layout.radius
+        self.eye_default_spacing = self.layout.spacing
+        self._setup_sprites() # Crea tutti gli sprite necessari
+        if backend == CP_BACKEND_TILEGRID: self._setup_tile_grids()
+        self.behaviour = self._load_behaviour()
+        self.timeline.clear()
+        self._ev_anim = self._ev_state_end = self._ev_state_eval = self._ev_idle = None
+        self._set_state(0, self._clock())
+        self.is_performing_blink_anim = False; self._anim = -1
+        self._setup_default_positions()
+
+        now = self._clock()
+        self._schedule_state_eval(now + self._get_random_delay(self.expression_eval_interval_s, self.expression_eval_interval_variation_s))
+        self._schedule_idle(now + self._get_random_delay(self.idle_interval_s, self.idle_interval_variation_s))
+        
+        if LIB_DEBUG_MODE: print(f"RoboEyesCP begin: Screen {self.screen_width}x{self.screen_height}, sprite {self.sprite_source} in {self.sprite_setup_ms} ms")
+
+
+    def update(self):
+        current_time = self._clock()
+        if self.event_trace is not None: self.event_trace.append((CP_EVENT_UPDATE, current_time))
+        if self._last_update_time is None: self._last_update_time = current_time
+        dt_ms = int((current_time - self._last_update_time) * 1000)
+        self._last_update_time += dt_ms / 1000 # Il resto sotto il ms resta per il prossimo frame
+        s = self.stats
+        if s is not None: s.start()
+
+        tbl = self.behaviour
+        if self._cmd_pending: self._apply_commands(current_time)
+        if s is not None: s.lap(STATS_CMD)
+        # Timeline: se la cima non è scaduta non c'è nulla da fare (stato, animazione, idle)
+        t = self.timeline.peek_time()
+        if t is not None and t <= current_time: self._run_events(current_time)
+        st = self._state_idx
+        if s is not None: s.lap(STATS_STATE)
+
+        m = self.motion
+        m.step(dt_ms)
+        self.eyeL_x, self.eyeL_y, self.eyeR_x, self.eyeR_y = m.px(0), m.px(1), m.px(2), m.px(3)
+        if s is not None: s.lap(STATS_TWEEN)
+        
+        if self.is_performing_blink_anim:
+            sprite_idx = tbl.anim_sprites[self._anim][self.blink_anim_current_frame]
+        else:
+            sprite_idx = tbl.state_sprite[st]
+        sprite_to_use_L = sprite_to_use_R = self.sprite_table[sprite_idx]
+        
+        eyeL_blit_y = self.eyeL_y + ((self.base_eye_height - sprite_to_use_L.height) >> 1)
+        eyeR_blit_y = self.eyeR_y + ((self.base_eye_height - sprite_to_use_R.height) >> 1)
+
+        lid_L = lid_R = None
+        lids = self.lid_override or tbl.state_lids[st]
+        if lids is not None:
+            if lids[1]: lid_L = self._get_lid(lids[0], lids[1], False, sprite_to_use_L)
+            if lids[2]: lid_R = self._get_lid(lids[0], lids[2], True, sprite_to_use_R)
+
+        if self._eye_grids is not None:
+            if s is not None: t0 = time.monotonic_ns()
+            drawn = self._render_tiles(sprite_idx, self.eyeL_x, self.eyeL_y,
+                                       sprite_idx, self.eyeR_x, self.eyeR_y, lid_L, lid_R)
+            if s is not None: s.add(STATS_BLIT, t0)
+        else:
+            drawn = self._render_eyes(sprite_to_use_L, self.eyeL_x, eyeL_blit_y,
+                                      sprite_to_use_R, self.eyeR_x, eyeR_blit_y, lid_L, lid_R)
+        if drawn and self.damage_rect is not None: # None se gli occhi sono tutti fuori schermo
+            d = self.pending_damage; r = self.damage_rect
+            self.pending_damage = r if d is None else (min(d[0], r[0]), min(d[1], r[1]), max(d[2], r[2]), max(d[3], r[3]))
+            if self.refresh_on_change and self.refresh_scheduler is None:
+                self.flush_refresh() # Solo quando il frame composto è cambiato
+        if s is not None: s.end(dt_ms, drawn, None if self._due is None else int((current_time - self._due) * 1000))
+        return drawn
+
+    def next_due(self):
+        # Istante (nel tempo del clock) in cui update() ha di nuovo qualcosa da fare: comando in
+        # coda, frame di movimento o primo evento della timeline. I comandi aspettano comunque
+        # un intervallo dall'ultimo update() (subito se il loop era fermo da più tempo): una
+        # raffica, anche sparsa su più task, produce al massimo un ridisegno per frame
+        now = self._clock()
+        interval = (self.frame_interval_ms or 50) / 1000
+        if self._cmd_pending or self._force_full_redraw:
+            last = self._last_update_time
+            return now if last is None else max(now, last + interval)
+        if not self.motion.settled(): return self._last_update_time + interval
+        due = self.timeline.peek_time()
+        return now + interval if due is None else due
+
+    def time_to_next_event(self):
+        # Secondi prima che update() abbia qualcosa da fare (0 se subito): per dormire il giusto
+        return max(0.0, self.next_due() - self._clock())
+
+    async def run(self):
+        # Loop asyncio al posto del while/sleep di code.py: update() e poi attesa fino a next_due(),
+        # lasciando la CPU agli altri task. Un comando (look_at/set_mood/blink) sveglia il loop,
+        # che ricalcola next_due(): il ridisegno arriva al prossimo frame, non a ogni comando
+        import asyncio # Libreria opzionale su CircuitPython: serve solo a chi usa run()
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                self.update()
+                while True:
+                    self._due = self.next_due()
+                    delay = self._due - self._clock()
+                    if delay <= 0: break
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        break
+                await asyncio.sleep(0)
+        finally:
+            self._wake = self._due = None
+
+
+# Politiche di scheduling dei refresh in RoboEyesCoordinator
+CP_SCHEDULE_ROUND_ROBIN = "round_robin"
+CP_SCHEDULE_PRIORITY = "priority"
+
+class PanelStats:
+    # Statistiche per pannello tenute da RoboEyesCoordinator
+    def __init__(self, priority=0):
+        self.priority = priority
+        self.updates = 0 # Chiamate a update()
+        self.frames_drawn = 0 # update() che hanno prodotto un frame
+        self.refreshes = 0 # display.refresh() eseguiti
+        self.deferred = 0 # Tick in cui un refresh pronto è stato rimandato per il budget
+        self.bus_bytes = 0 # Byte stimati inviati sul bus
+        self.max_latency_s = 0.0 # Massimo ritardo tra frame pronto e refresh
+        self.pending_since = None
+
+    def as_dict(self):
+        return {"priority": self.priority, "updates": self.updates, "frames_drawn": self.frames_drawn,
+                "refreshes": self.refreshes, "deferred": self.deferred, "bus_bytes": self.bus_bytes,
+                "max_latency_s": self.max_latency_s}
+
+class RoboEyesCoordinator:
+    # Più pannelli RoboEyesCP sullo stesso bus: sprite cache e palette condivise (immutabili),
+    # logica e animazione di tutti i pannelli ad ogni tick, refresh schedulati round-robin
+    # o per priorità entro un budget di byte/s sul bus.
+    #
+    #   coord = RoboEyesCoordinator(bus_budget_bytes_per_s=20000)
+    #   left = coord.add(display_l); left.begin(128, 64, 20)
+    #   right = coord.add(display_r, priority=1); right.begin(128, 64, 20)
+    #   while True: coord.update(); time.sleep(0.05)
+    def __init__(self, bus_budget_bytes_per_s=None, policy=CP_SCHEDULE_ROUND_ROBIN, clock=None, sprite_cache=None, palette=None):
+        if policy not in (CP_SCHEDULE_ROUND_ROBIN, CP_SCHEDULE_PRIORITY):
+            raise ValueError("politica di scheduling sconosciuta: " + str(policy))
+        self._clock = clock if clock is not None else time.monotonic
+        self.sprite_cache = sprite_cache if sprite_cache is not None else SpriteCache()
+        if palette is None:
+            palette = displayio.Palette(2)
+            palette[CP_BGCOLOR] = 0x000000
+            palette[CP_MAINCOLOR] = 0xFFFFFF
+        self.palette = palette
+        self.policy = policy
+        self.bus_budget_bytes_per_s = bus_budget_bytes_per_s # None = nessun limite
+        self.panels = []
+        self.stats = []
+        self._next_rr = 0
+        self._credit = 0.0
+        self._last_time = None
+
+    def add(self, display_driver_instance, priority=0, seed=None):
+        # Crea un pannello che condivide cache, palette e orologio; va poi chiamato begin() sul pannello
+        eyes = RoboEyesCP(display_driver_instance, clock=self._clock, seed=seed,
+                          sprite_cache=self.sprite_cache, palette=self.palette)
+        self.attach(eyes, priority)
+        return eyes
+
+    def attach(self, eyes, priority=0):
+        eyes.set_refresh_on_change(True)
+        eyes.refresh_scheduler = self
+        self.panels.append(eyes)
+        self.stats.append(PanelStats(priority))
+        return eyes
+
+    def _order(self, ready):
+        if self.policy == CP_SCHEDULE_PRIORITY:
+            # Priorità più alta prima, a parità chi aspetta da più tempo
+            ready.sort(key=lambda i: (-self.stats[i].priority, self.stats[i].pending_since))
+            return ready
+        n = len(self.panels)
+        ready.sort(key=lambda i: (i - self._next_rr) % n)
+        return ready
+
+    def update(self):
+        # Un tick: update() di tutti i pannelli, poi i refresh che stanno nel budget. Ritorna i refresh fatti.
+        now = self._clock()
+        budget = self.bus_budget_bytes_per_s
+        if budget is not None:
+            if self._last_time is not None:
+                self._credit = min(float(budget), self._credit + budget * (now - self._last_time)) # Al massimo 1 s di burst
+            else:
+                self._credit = float(budget)
+        self._last_time = now
+
+        ready = []
+        for i, eyes in enumerate(self.panels):
+            st = self.stats[i]
+            st.updates += 1
+            if eyes.update(): st.frames_drawn += 1
+            if eyes.pending_damage is not None:
+                if st.pending_since is None: st.pending_since = now
+                ready.append(i)
+
+        refreshed = 0
+        for i in self._order(ready):
+            eyes, st = self.panels[i], self.stats[i]
+            cost = damage_bus_bytes(eyes.pending_damage)
+            # Un frame più grande dell'intero budget passa quando il credito è pieno (niente starvation)
+            if budget is not None and cost > self._credit and self._credit < budget:
+                st.deferred += 1
+                continue
+            eyes.flush_refresh()
+            if budget is not None: self._credit -= cost
+            st.refreshes += 1
+            st.bus_bytes += cost
+            latency = now - st.pending_since
+            if latency > st.max_latency_s: st.max_latency_s = latency
+            st.pending_since = None
+            self._next_rr = (i + 1) % len(self.panels)
+            refreshed += 1
+        return refreshed
+
+    def panel_stats(self):
+        return [st.as_dict() for st in self.stats]
@@ -0,0 +1,139 @@
+# robo_eyes_pack.py
+# Geometria degli sprite e formato del "pack" di sprite precompilati.
+# Questo modulo non importa displayio/bitmaptools: lo usano sia robo_eyes_cp
+# sul dispositivo sia tools/build_sprite_pack.py sull'host.
+#
+# Formato (little endian):
+#   header   "<4sBBHHH"  magic b"REYE", versione, numero sprite, eye_w, eye_h, raggio
+#   indice   "<HHHI"     per ogni sprite: w, h, raggio, offset dei dati dall'inizio del file
+#   dati     1 bit per pixel, righe allineate al byte, MSB = pixel più a sinistra
+#            (il layout letto da bitmaptools.readinto(bits_per_pixel=1))
+
+import struct
+
+PACK_MAGIC = b"REYE"
+PACK_VERSION = 1
+_HEADER = "<4sBBHHH"
+_ENTRY = "<HHHI"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+_ENTRY_SIZE = struct.calcsize(_ENTRY)
+
+
+def _isqrt(n):
+    # Radice intera (floor) senza dipendere da math.isqrt, assente su CircuitPython
+    if n <= 0: return 0
+    k = int(n ** 0.5)
+    while k * k > n: k -= 1
+    while (k + 1) * (k + 1) <= n: k += 1
+    return k
+
+def _round_rect_spans(w, h, r):
+    # Scanline di un rettangolo arrotondato: lista di (y0, y1, x0, x1) con righe
+    # consecutive identiche già fuse. Stesso risultato pixel del vecchio disegno
+    # a cerchi pieni (centri in r e w-r-1 / h-r-1), ma ogni angolo è calcolato una volta.
+    spans = []
+    for y in range(h):
+        if r == 0 or (h > 2 * r and r <= y < h - r):
+            x0, x1 = 0, w
+        else:
+            x0, x1 = (r, w - r) if w > 2 * r else (w, 0)
+            for cy in (r, h - r - 1):
+                dy = y - cy
+                if -r <= dy <= r:
+                    k = _isqrt(r * r - dy * dy)
+                    x0 = min(x0, r - k, w - r - 1 - k)
+                    x1 = max(x1, r + k + 1, w - r + k)
+            if x0 < 0: x0 = 0
+            if x1 > w: x1 = w
+        if x1 <= x0: continue
+        if spans and spans[-1][1] == y and spans[-1][2] == x0 and spans[-1][3] == x1:
+            spans[-1] = (spans[-1][0], y + 1, x0, x1)
+        else:
+            spans.append((y, y + 1, x0, x1))
+    return spans
+
+# Forme di palpebra (maschere sovrapposte allo sprite dell'occhio)
+LID_ANGRY = "angry" # Obliqua, bassa verso il naso
+LID_TIRED = "tired" # Obliqua, bassa verso l'esterno
+LID_CURIOUS = "curious" # Ad arco, più bassa al centro
+LID_SHAPES = (LID_ANGRY, LID_TIRED, LID_CURIOUS)
+
+def lid_spans(kind, w, depth, mirror=False):
+    # Righe coperte dalla palpebra dell'occhio sinistro (il naso è a destra, x = w-1):
+    # lista di (y, x0, x1) con y < depth. mirror=True per l'occhio destro.
+    spans = []
+    for y in range(depth):
+        if kind == LID_ANGRY:
+            x0, x1 = y * w // depth, w
+        elif kind == LID_TIRED:
+            x0, x1 = 0, w if 2 * y < depth else 2 * w * (depth - y) // depth
+        elif kind == LID_CURIOUS:
+            hw = _isqrt((w - 1) * (w - 1) * (depth - y) // depth)
+            x0, x1 = (w - hw) // 2, (w - 1 + hw) // 2 + 1
+        else:
+            raise ValueError("palpebra sconosciuta: " + str(kind))
+        if mirror: x0, x1 = w - x1, w - x0
+        if x1 > x0: spans.append((y, x0, x1))
+    return spans
+
+def clamp_radius(w, h, r):
+    return max(0, min(int(r), int(w) // 2, int(h) // 2))
+
+def sprite_specs(eye_w, eye_h, radius):
+    # Set di sprite base per una geometria occhio: lista ordinata di (nome, w, h, raggio)
+    h_half = max(1, int(eye_h * 0.55))
+    h_line = max(1, eye_h // 6) # 6 px con l'occhio di riferimento da 36
+    blink_h_intermediate = max(1, int(eye_h * 0.35))
+    specs = (
+        ("open", eye_w, eye_h, radius),
+        ("happy", eye_w, h_half, radius // 2 if radius > 1 else 1),
+        ("sleepy", eye_w, h_line, 2 if h_line > 3 else 1),
+        ("blink_mid", eye_w, blink_h_intermediate, radius // 3 if radius > 2 else 1),
+    )
+    return [(name, int(w), int(h), clamp_radius(w, h, r)) for name, w, h, r in specs]
+
+def row_stride(w):
+    return (w + 7) // 8
+
+def pack_round_rect(w, h, r):
+    # Rettangolo arrotondato impacchettato a 1 bit (1 = colore principale)
+    stride = row_stride(w)
+    data = bytearray(stride * h)
+    for y0, y1, x0, x1 in _round_rect_spans(w, h, r):
+        for y in range(y0, y1):
+            base = y * stride
+            for x in range(x0, x1):
+                data[base + (x >> 3)] |= 0x80 >> (x & 7)
+    return data
+
+def write_sprite_pack(stream, eye_w, eye_h, radius):
+    specs = sprite_specs(eye_w, eye_h, radius)
+    offset = _HEADER_SIZE + _ENTRY_SIZE * len(specs)
+    stream.write(struct.pack(_HEADER, PACK_MAGIC, PACK_VERSION, len(specs), eye_w, eye_h, radius))
+    blobs = []
+    for _, w, h, r in specs:
+        blob = pack_round_rect(w, h, r)
+        stream.write(struct.pack(_ENTRY, w, h, r, offset))
+        offset += len(blob)
+        blobs.append(blob)
+    for blob in blobs: stream.write(blob)
+    return offset # Dimensione totale in byte
+
+def read_pack_index(stream, eye_w, eye_h, radius):
+    # Ritorna [(w, h, offset), ...] nell'ordine di sprite_specs, oppure None se
+    # il pack non è valido o è stato generato per un'altra geometria (stale)
+    header = stream.read(_HEADER_SIZE)
+    if len(header) < _HEADER_SIZE: return None
+    magic, version, count, p_w, p_h, p_r = struct.unpack(_HEADER, header)
+    if magic != PACK_MAGIC or version != PACK_VERSION: return None
+    if (p_w, p_h, p_r) != (eye_w, eye_h, radius): return None
+    specs = sprite_specs(eye_w, eye_h, radius)
+    if count != len(specs): return None
+    index = []
+    for _, w, h, r in specs:
+        entry = stream.read(_ENTRY_SIZE)
+        if len(entry) < _ENTRY_SIZE: return None
+        e_w, e_h, e_r, offset = struct.unpack(_ENTRY, entry)
+        if (e_w, e_h, e_r) != (w, h, r): return None
+        index.append((w, h, offset))
+    return index
@@ -0,0 +1,234 @@
+# robo_eyes_stream.py
+# Sequenze di frame pre-renderizzate: registrazione e riproduzione da SD quasi senza CPU
+# (per unità demo/kiosk che non hanno bisogno del comportamento procedurale).
+# L'encoder è Python puro: lo stesso stream si produce sull'host (tools/record_stream.py).
+#
+# Formato (little endian):
+#   header   "<4sBHH"  magic b"REYS", versione, larghezza, altezza
+#   frame    "<IH"     tempo in ms dal primo frame, lunghezza del payload; poi il payload
+#   payload  XOR del frame (1 bit per pixel, righe allineate al byte, MSB a sinistra, come
+#            robo_eyes_pack) col frame precedente, codificato a run: un byte di controllo c,
+#            c < 0x80: salta c+1 byte invariati, c >= 0x80: seguono (c & 0x7F)+1 byte di XOR.
+#            Gli zeri finali non vengono scritti. Il primo frame è XOR col frame vuoto.
+#   L'ultimo frame riporta l'immagine al primo: in loop si riparte dal secondo frame
+#   senza ridisegnare lo schermo.
+
+import struct
+import time
+import bitmaptools
+
+STREAM_MAGIC = b"REYS"
+STREAM_VERSION = 1
+_HEADER = "<4sBHH"
+_FRAME = "<IH"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+_FRAME_SIZE = struct.calcsize(_FRAME)
+_RUN_MAX = 128
+
+# Byte a 1 bit -> 8 indici palette (0 = sfondo, 1 = colore principale)
+_EXPAND = bytes((b >> (7 - i)) & 1 for b in range(256) for i in range(8))
+
+
+def row_stride(w):
+    return (w + 7) // 8
+
+def max_payload(w, h):
+    # Caso peggiore: tutti i byte diversi, un byte di controllo ogni _RUN_MAX
+    n = row_stride(w) * h
+    return n + (n + _RUN_MAX - 1) // _RUN_MAX
+
+def encode_delta(prev, cur):
+    # Payload che trasforma prev in cur (stessa lunghezza)
+    out = bytearray()
+    n = len(cur)
+    i = 0
+    while i < n:
+        j = i
+        while j < n and prev[j] == cur[j]: j += 1
+        if j == n: break # Zeri finali: non servono
+        while j - i > 0:
+            k = min(j - i, _RUN_MAX)
+            out.append(k - 1); i += k
+        j = i
+        while j < n and j - i < _RUN_MAX and prev[j] != cur[j]: j += 1
+        out.append(0x80 | (j - i - 1))
+        out.extend(prev[k] ^ cur[k] for k in range(i, j))
+        i = j
+    return out
+
+def pack_bitmap(bitmap, packed, rect=None, bg=0):
+    # Aggiorna packed (1 bit per pixel) dai pixel di bitmap nell'area rect (x0, y0, x1, y1)
+    w = bitmap.width
+    stride = row_stride(w)
+    x0, y0, x1, y1 = rect if rect is not None else (0, 0, w, bitmap.height)
+    c0, c1 = x0 >> 3, (x1 + 7) >> 3
+    for y in range(y0, y1):
+        base = y * stride
+        for c in range(c0, c1):
+            v = 0
+            for x in range(c << 3, min((c + 1) << 3, w)):
+                if bitmap[x, y] != bg: v |= 0x80 >> (x & 7)
+            packed[base + c] = v
+
+
+class StreamRecorder:
+    # Scrive i frame di RoboEyesCP (backend blit) in uno stream. Ad ogni frame viene
+    # ricompattata solo l'area cambiata (damage_rect); i frame invariati non si scrivono.
+    #
+    #   rec = StreamRecorder(open("/sd/robo_eyes_stream.bin", "wb"), 128, 64)
+    #   if eyes.update(): rec.add(eyes.screen_bitmap, t_ms, eyes.damage_rect)
+    #   rec.close(t_ms_fine)
+    def __init__(self, stream, width, height):
+        self.stream = stream
+        self.width, self.height = width, height
+        size = row_stride(width) * height
+        self._prev = bytearray(size)
+        self._cur = bytearray(size)
+        self._first = None
+        self._t0 = None
+        self.frames = 0
+        stream.write(struct.pack(_HEADER, STREAM_MAGIC, STREAM_VERSION, width, height))
+        self.bytes_written = _HEADER_SIZE
+
+    def _write(self, t_ms, payload):
+        self.stream.write(struct.pack(_FRAME, t_ms, len(payload)))
+        self.stream.write(payload)
+        self.bytes_written += _FRAME_SIZE + len(payload)
+        self.frames += 1
+
+    def add(self, bitmap, t_ms, rect=None):
+        # rect=None ricompatta tutto il frame (sempre, per il primo)
+        if self._t0 is None: self._t0 = t_ms; rect = None
+        pack_bitmap(bitmap, self._cur, rect)
+        if self._first is not None and self._cur == self._prev: return
+        self._write(t_ms - self._t0, encode_delta(self._prev, self._cur))
+        if self._first is None: self._first = bytes(self._cur)
+        self._prev[:] = self._cur
+
+    def close(self, end_ms):
+        # Frame di chiusura al tempo end_ms: riporta al primo frame per il loop
+        if self._first is not None:
+            self._write(max(0, end_ms - self._t0), encode_delta(self._prev, self._first))
+        self.stream.flush()
+
+
+def record_frames(eyes, stream, n, dt):
+    # Simula n update() da dt secondi (vedi RoboEyesCP.render_frames) e li registra
+    if eyes.screen_bitmap is None: raise ValueError("la registrazione richiede il backend blit")
+    rec = StreamRecorder(stream, eyes.screen_width, eyes.screen_height)
+    for i, bitmap in enumerate(eyes.render_frames(n, dt, frames=True)):
+        if i == 0 or eyes.damage_rect is not None: rec.add(bitmap, int(i * dt * 1000 + 0.5), eyes.damage_rect)
+    rec.close(int(n * dt * 1000 + 0.5))
+    return rec
+
+
+class StreamPlayer:
+    # Riproduce uno stream in bitmap (di solito RoboEyesCP.screen_bitmap) un frame alla volta:
+    # in memoria solo il frame corrente compattato, il payload di un frame e una fascia di 8
+    # righe espansa per arrayblit, indipendentemente dalla lunghezza dello stream.
+    # Il bitmap viene pulito subito (lo stream parte dal frame vuoto): il primo update()
+    # riporta tutto lo schermo come cambiato.
+    def __init__(self, stream, bitmap, loop=True, clock=None):
+        header = stream.read(_HEADER_SIZE)
+        if len(header) < _HEADER_SIZE: raise ValueError("stream troppo corto")
+        magic, version, w, h = struct.unpack(_HEADER, header)
+        if magic != STREAM_MAGIC or version != STREAM_VERSION: raise ValueError("stream non valido")
+        if (w, h) != (bitmap.width, bitmap.height): raise ValueError(f"stream {w}x{h} per un bitmap {bitmap.width}x{bitmap.height}")
+        self.stream = stream
+        self.bitmap = bitmap
+        self.loop = loop
+        self._clock = clock or time.monotonic
+        self.width, self.height = w, h
+        self._stride = row_stride(w)
+        self._cur = bytearray(self._stride * h)
+        self._payload = bytearray(max_payload(w, h))
+        self._band = bytearray(self._stride * 8 * 8)
+        self._frame_header = bytearray(_FRAME_SIZE)
+        self._loop_offset = None # Offset del secondo frame, noto dopo il primo
+        self._start_ms = None
+        self._next_t = self._read_frame_header()
+        bitmap.fill(0) # Via gli occhi già disegnati (es. da RoboEyesCP.update())
+        self._cleared = True # Il prossimo update() deve inviare tutto lo schermo
+        self.damage_rect = None # Area riscritta dall'ultimo update() (None se nessun frame)
+        self.frames_played = 0
+
+    def _read_frame_header(self):
+        # Tempo del prossimo frame, None a fine stream
+        if self.stream.readinto(self._frame_header) < _FRAME_SIZE: return None
+        t, self._next_len = struct.unpack(_FRAME, self._frame_header)
+        if self._next_len > len(self._payload): raise ValueError("frame troppo grande")
+        return t
+
+    def _apply(self):
+        n = self._next_len
+        payload = memoryview(self._payload)[:n]
+        if self.stream.readinto(payload) < n: raise ValueError("stream troncato")
+        cur, stride = self._cur, self._stride
+        # Fasce da 8 righe toccate: per ognuna la colonna-byte minima e massima cambiate
+        bands = {}
+        pos, i = 0, 0
+        while i < n:
+            c = payload[i]; i += 1
+            if c < 0x80:
+                pos += c + 1
+                continue
+            for k in range((c & 0x7F) + 1):
+                cur[pos] ^= payload[i]; i += 1
+                y, col = divmod(pos, stride)
+                band = bands.get(y >> 3)
+                if band is None: bands[y >> 3] = [col, col]
+                elif col < band[0]: band[0] = col
+                elif col > band[1]: band[1] = col
+                pos += 1
+        self.damage_rect = None
+        for b, (c0, c1) in bands.items():
+            self._blit_band(b, c0, c1 + 1)
+
+    def _blit_band(self, b, c0, c1):
+        # Espande le colonne-byte [c0, c1) delle righe della fascia b e le copia con arrayblit
+        x0, x1 = c0 << 3, min(c1 << 3, self.width)
+        y0, y1 = b << 3, min((b + 1) << 3, self.height)
+        row_px = x1 - x0
+        band, cur, stride = self._band, self._cur, self._stride
+        j = 0
+        for y in range(y0, y1):
+            base = y * stride
+            for c in range(c0, c1):
+                k = cur[base + c] << 3
+                take = min(8, x1 - (c << 3))
+                band[j:j + take] = _EXPAND[k:k + take]
+                j += take
+        bitmaptools.arrayblit(self.bitmap, memoryview(band)[:row_px * (y1 - y0)], x0, y0, x1, y1)
+        d = self.damage_rect
+        self.damage_rect = (x0, y0, x1, y1) if d is None else (min(d[0], x0), min(d[1], y0), max(d[2], x1), max(d[3], y1))
+
+    def update(self, now_s=None):
+        # Applica i frame scaduti; ritorna True se il bitmap è cambiato. now_s di default dal clock
+        if now_s is None: now_s = self._clock()
+        now_ms = int(now_s * 1000 + 0.5)
+        if self._start_ms is None: self._start_ms = now_ms
+        drawn = False
+        damage = None
+        if self._cleared:
+            self._cleared = False
+            drawn, damage = True, (0, 0, self.width, self.height)
+        while self._next_t is not None and now_ms - self._start_ms >= self._next_t:
+            end_t = self._next_t
+            self._apply()
+            if self.damage_rect is not None:
+                d, r = damage, self.damage_rect
+                damage = r if d is None else (min(d[0], r[0]), min(d[1], r[1]), max(d[2], r[2]), max(d[3], r[3]))
+                drawn = True
+            self.frames_played += 1
+            if self._loop_offset is None: self._loop_offset = self.stream.tell()
+            self._next_t = self._read_frame_header()
+            if self._next_t is None and self.loop and end_t > 0:
+                # Fine stream: il frame di chiusura ha già riportato il bitmap al primo frame
+                self.stream.seek(self._loop_offset)
+                self._start_ms += end_t
+                self._next_t = self._read_frame_header()
+        self.damage_rect = damage
+        return drawn
+
+    def finished(self):
+        return self._next_t is None
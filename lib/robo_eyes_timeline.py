@@ -0,0 +1,227 @@
+# robo_eyes_timeline.py
+# Animazioni e comportamento degli occhi definiti come dati (JSON su /sd o flash)
+# e compilati in tabelle compatte basate su array: a runtime i frame avanzano per
+# eventi della Timeline e la scelta della transizione è una bisect, senza catene di if.
+#
+# Formato (i nomi di sprite sono quelli di robo_eyes_pack.sprite_specs):
+# {
+#   "animations": {"blink": [["blink_mid", 70], ["sleepy", 70], ...]},      # [sprite, durata ms]
+#   "states": {
+#     "default": {"sprite": "open"},
+#     "sleepy": {"sprite": "sleepy", "duration_s": [2.0, 4.0],
+#                "idle_chance": 0.25, "idle_scale": 0.5},                    # movimento idle ridotto
+#     "angry": {"sprite": "open", "duration_s": [1.5, 3.0], "lids": ["angry", 0.45, 0.45]}
+#   },
+#   "transitions": [{"weight": 35, "animation": "blink"}, {"weight": 20, "state": "happy"}, ...]
+# }
+# Le transizioni sono pesate e valutate dallo stato "default". L'animazione "blink" è
+# obbligatoria e le palpebre sono una delle forme di robo_eyes_pack (angry/tired/curious).
+
+from array import array
+from robo_eyes_pack import LID_SHAPES
+
+STATE_DEFAULT = "default"
+ANIMATION_BLINK = "blink" # Obbligatoria: la usano blink() e l'autoblinker
+TRANSITION_STATE = 0
+TRANSITION_ANIMATION = 1
+
+# Comportamento di default: equivalente alla vecchia logica scritta nel codice
+DEFAULT_BEHAVIOUR = {
+    "animations": {
+        "blink": [["blink_mid", 70], ["sleepy", 70], ["blink_mid", 70], ["open", 70]],
+    },
+    "states": {
+        "default": {"sprite": "open"},
+        "happy": {"sprite": "happy", "duration_s": [1.5, 3.0]},
+        "sleepy": {"sprite": "sleepy", "duration_s": [2.0, 4.0], "idle_chance": 0.25, "idle_scale": 0.5},
+        "surprised": {"sprite": "open", "duration_s": [1.0, 2.0], "idle_chance": 0},
+        "angry": {"sprite": "open", "duration_s": [1.5, 3.0], "lids": ["angry", 0.45, 0.45]},
+        "tired": {"sprite": "open", "duration_s": [2.0, 4.0], "lids": ["tired", 0.5, 0.5]},
+        "curious": {"sprite": "open", "duration_s": [1.0, 2.5], "lids": ["curious", 0.4, 0]},
+    },
+    "transitions": [
+        {"weight": 35, "animation": "blink"},
+        {"weight": 20, "state": "happy"},
+        {"weight": 15, "state": "sleepy"},
+        {"weight": 10, "state": "surprised"},
+        {"weight": 7, "state": "angry"},
+        {"weight": 7, "state": "tired"},
+        {"weight": 6, "state": "curious"},
+    ],
+}
+
+
+def bisect_right(a, x):
+    # Come bisect.bisect_right (il modulo bisect non c'è su CircuitPython)
+    lo, hi = 0, len(a)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if x < a[mid]: hi = mid
+        else: lo = mid + 1
+    return lo
+
+def quantize_level(amount, levels):
+    # Chiusura continua 0.0-1.0 -> livello intero 0..levels-1
+    amount = 0.0 if amount < 0 else 1.0 if amount > 1 else amount
+    return int(amount * (levels - 1) + 0.5)
+
+
+class CompiledBehaviour:
+    # Tabelle compilate. Animazioni: per ogni animazione un array di indici sprite e uno
+    # dei tempi di fine cumulativi (ms). Stati: array paralleli indicizzati dall'indice
+    # di stato (0 = default). Transizioni: pesi cumulativi + tipo + indice destinazione.
+    def __init__(self):
+        self.animation_names = []
+        self.anim_sprites = []
+        self.anim_ends = []
+        self.state_names = []
+        self.state_index = {}
+        self.state_sprite = array("B")
+        self.state_min_ms = array("L")
+        self.state_max_ms = array("L")
+        self.state_idle_chance = array("B") # Percentuale di tick idle in cui muoversi
+        self.state_idle_scale = array("B") # Percentuale dell'ampiezza idle
+        self.state_lids = [] # (forma, livello L, livello R) oppure None
+        self.trans_cum = array("L")
+        self.trans_kind = array("B")
+        self.trans_target = array("B")
+
+    def animation(self, name):
+        return self.animation_names.index(name)
+
+    def duration_ms(self, anim):
+        ends = self.anim_ends[anim]
+        return ends[-1] if len(ends) else 0
+
+    def pick_transition(self, r):
+        # r in [0, 1): ritorna l'indice della transizione scelta secondo i pesi
+        return bisect_right(self.trans_cum, int(r * self.trans_cum[-1]))
+
+
+def compile_behaviour(data, sprite_names, lid_levels):
+    # Valida i dati e li compila; ValueError con un messaggio se qualcosa non torna
+    sprite_idx = {name: i for i, name in enumerate(sprite_names)}
+    def sprite(name):
+        if name not in sprite_idx: raise ValueError("sprite sconosciuto: " + str(name))
+        return sprite_idx[name]
+
+    c = CompiledBehaviour()
+    for name, frames in data.get("animations", {}).items():
+        sprites, ends, t = array("B"), array("L"), 0
+        for frame in frames:
+            t += int(frame[1])
+            if int(frame[1]) <= 0: raise ValueError("durata frame non valida in " + name)
+            sprites.append(sprite(frame[0]))
+            ends.append(t)
+        c.animation_names.append(name)
+        c.anim_sprites.append(sprites)
+        c.anim_ends.append(ends)
+
+    if ANIMATION_BLINK not in c.animation_names: raise ValueError("manca l'animazione " + ANIMATION_BLINK)
+
+    states = data.get("states", {})
+    if STATE_DEFAULT not in states: raise ValueError("manca lo stato default")
+    for name in [STATE_DEFAULT] + sorted(n for n in states if n != STATE_DEFAULT):
+        st = states[name]
+        c.state_index[name] = len(c.state_names)
+        c.state_names.append(name)
+        c.state_sprite.append(sprite(st.get("sprite", "open")))
+        dur = st.get("duration_s", [0, 0])
+        c.state_min_ms.append(int(dur[0] * 1000)); c.state_max_ms.append(int(dur[1] * 1000))
+        c.state_idle_chance.append(int(st.get("idle_chance", 1.0) * 100 + 0.5))
+        c.state_idle_scale.append(int(st.get("idle_scale", 1.0) * 100 + 0.5))
+        lids = st.get("lids")
+        if lids and lids[0] not in LID_SHAPES: raise ValueError("palpebra sconosciuta in " + name + ": " + str(lids[0]))
+        c.state_lids.append((lids[0], quantize_level(lids[1], lid_levels),
+                             quantize_level(lids[2] if len(lids) > 2 else lids[1], lid_levels)) if lids else None)
+
+    total = 0
+    for tr in data.get("transitions", []):
+        weight = int(tr.get("weight", 1))
+        if weight <= 0: continue
+        if "animation" in tr:
+            if tr["animation"] not in c.animation_names: raise ValueError("animazione sconosciuta: " + str(tr["animation"]))
+            c.trans_kind.append(TRANSITION_ANIMATION); c.trans_target.append(c.animation(tr["animation"]))
+        else:
+            if tr.get("state") not in c.state_index: raise ValueError("stato sconosciuto: " + str(tr.get("state")))
+            c.trans_kind.append(TRANSITION_STATE); c.trans_target.append(c.state_index[tr["state"]])
+        total += weight
+        c.trans_cum.append(total)
+    if not total: raise ValueError("nessuna transizione")
+    return c
+
+
+# --- Scheduler a eventi ---
+# Min-heap di eventi a tempo: a ogni frame basta guardare la cima (O(1)) per sapere se
+# c'è qualcosa da fare e quanto manca al prossimo evento.
+
+try:
+    from heapq import heappush, heappop
+except ImportError: # CircuitPython non ha heapq
+    def heappush(heap, item):
+        heap.append(item)
+        i = len(heap) - 1
+        while i:
+            parent = (i - 1) >> 1
+            if not item < heap[parent]: break
+            heap[i] = heap[parent]
+            i = parent
+        heap[i] = item
+
+    def heappop(heap):
+        last = heap.pop()
+        if not heap: return last
+        top = heap[0]
+        n, i = len(heap), 0
+        while True:
+            c = 2 * i + 1
+            if c >= n: break
+            if c + 1 < n and heap[c + 1] < heap[c]: c += 1
+            if not heap[c] < last: break
+            heap[i] = heap[c]
+            i = c
+        heap[i] = last
+        return top
+
+
+class Timeline:
+    # Eventi [tempo, priorità, sequenza, tipo, argomento]: a parità di tempo esce prima la
+    # priorità più bassa, poi l'ordine di inserimento. schedule() ritorna l'evento stesso
+    # come token; cancel() lo marca (tipo None) e verrà scartato quando arriva in cima.
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def schedule(self, t, kind, arg=None, priority=0):
+        self._seq += 1
+        event = [t, priority, self._seq, kind, arg]
+        heappush(self._heap, event)
+        return event
+
+    def cancel(self, token):
+        if token is not None: token[3] = None
+
+    def pending_time(self, token):
+        # Tempo dell'evento se è ancora in coda (non eseguito né cancellato), altrimenti None
+        return None if token is None or token[3] is None else token[0]
+
+    def peek_time(self):
+        # Tempo del prossimo evento valido, None se non ce ne sono
+        heap = self._heap
+        while heap and heap[0][3] is None: heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        # (tempo, tipo, argomento) del primo evento scaduto entro now, None se nessuno
+        t = self.peek_time()
+        if t is None or t > now: return None
+        event = heappop(self._heap)
+        kind = event[3]
+        event[3] = None # Già eseguito: un cancel() successivo non ha effetto
+        return t, kind, event[4]
+
+    def clear(self):
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
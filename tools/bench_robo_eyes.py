@@ -0,0 +1,189 @@
+# bench_robo_eyes.py
+# Benchmark su workstation di RoboEyesCP usando il backend host (tools/host):
+# costo per frame diviso per fase, tempo di costruzione degli sprite (generati o
+# letti dal pack) e byte stimati sul bus, per più dimensioni di schermo e per
+# entrambi i backend (blit e TileGrid). Registra inoltre un hash
+# "golden" della sequenza di frame composti, per verificare che il lavoro
+# di ottimizzazione sul renderer resti identico al pixel.
+#
+#   python tools/bench_robo_eyes.py                   # benchmark + confronto con i golden
+#   python tools/bench_robo_eyes.py --check           # solo golden, exit 1 se cambiano
+#   python tools/bench_robo_eyes.py --update-golden   # riscrive tools/golden_frames.json
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(_HERE, "host"), os.path.join(_HERE, "..", "lib")]
+
+import robo_eyes_cp  # noqa: E402
+from host_display import HostDisplay  # noqa: E402
+from robo_eyes_pack import write_sprite_pack  # noqa: E402
+
+GOLDEN_PATH = os.path.join(_HERE, "golden_frames.json")
+SCREEN_SIZES = ((128, 32), (128, 64), (128, 128), (320, 240))
+BACKENDS = (robo_eyes_cp.CP_BACKEND_BLIT, robo_eyes_cp.CP_BACKEND_TILEGRID)
+PHASES = ("state", "blink", "clear", "blit", "other", "refresh")
+# Sequenza con comandi esterni (blink/look_at/set_mood) a 100 fps: frame vicini ai tempi
+# degli eventi, dove gli arrotondamenti del clock contano. Chiave golden "WxH/commands"
+COMMAND_RUN = (128, 64, 100, 3000)
+
+
+class _PhaseTimer:
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0)
+        self._stack = []
+
+    def wrap(self, obj, name, phase):
+        fn = getattr(obj, name)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter_ns()
+            self._stack.append(0)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - t0
+                inner = self._stack.pop()
+                self.totals[phase] += elapsed - inner # Tempo proprio, senza le fasi annidate
+                if self._stack: self._stack[-1] += elapsed
+        setattr(obj, name, timed)
+
+    def begin_frame(self):
+        self._stack.append(0)
+
+    def end_frame(self, elapsed):
+        inner = self._stack.pop()
+        self.totals["other"] += elapsed - inner
+
+
+def _sprite_build_ms(width, height, repeats=5, pack=False):
+    # Costruzione degli sprite a cache vuota, miglior tempo su più ripetizioni: generazione
+    # procedurale, oppure con pack=True lettura di un pack scritto per la stessa geometria
+    eyes = robo_eyes_cp.RoboEyesCP(HostDisplay(width, height))
+    eyes.sprite_pack_path = None
+    eyes.begin(width, height, 8)
+    pack_file = None
+    if pack:
+        pack_file = tempfile.NamedTemporaryFile(suffix=".bin", delete=False)
+        with pack_file: write_sprite_pack(pack_file, eyes.base_eye_width, eyes.base_eye_height, eyes.eye_border_radius)
+        eyes.sprite_pack_path = pack_file.name
+    best = None
+    try:
+        for _ in range(repeats):
+            eyes.sprite_cache.clear()
+            t0 = time.perf_counter()
+            eyes._setup_sprites()
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        if eyes.sprite_source != ("pack" if pack else "procedural"): raise RuntimeError("sprite da " + eyes.sprite_source)
+    finally:
+        if pack_file is not None: os.remove(pack_file.name)
+    return best * 1000
+
+
+def _send_commands(eyes, i):
+    if i % 37 == 0: eyes.blink()
+    if i % 23 == 0: eyes.look_at(((i * 7) % 21 - 10) / 10, ((i * 3) % 11 - 5) / 5)
+    if i % 401 == 0: eyes.set_mood(eyes.behaviour.state_names[(i // 401) % len(eyes.behaviour.state_names)])
+
+
+def run_size(width, height, frames, fps, seed, backend=robo_eyes_cp.CP_BACKEND_BLIT, commands=False):
+    clock = robo_eyes_cp.ManualClock(1000.0)
+    display = HostDisplay(width, height)
+    eyes = robo_eyes_cp.RoboEyesCP(display, clock=clock, seed=seed)
+    eyes.sprite_pack_path = None
+    eyes.begin(width, height, fps, backend)
+
+    timer = _PhaseTimer()
+    timer.wrap(eyes, "_run_events", "state")
+    timer.wrap(eyes, "_handle_animation", "blink")
+    timer.wrap(eyes, "_clear_rect", "clear")
+    timer.wrap(eyes, "_blit_sprite", "blit")
+    timer.wrap(eyes, "_render_tiles", "blit") # Backend TileGrid: aggiornamento delle TileGrid
+    timer.wrap(display, "refresh", "refresh")
+
+    digest = hashlib.sha1()
+    drawn = 0
+    for i in range(frames):
+        if commands: _send_commands(eyes, i)
+        timer.begin_frame()
+        t0 = time.perf_counter_ns()
+        if eyes.update(): drawn += 1
+        display.auto_tick()
+        timer.end_frame(time.perf_counter_ns() - t0)
+        digest.update(display.framebuffer)
+        clock.advance(1.0 / fps)
+    return {
+        "frames": frames,
+        "drawn": drawn,
+        "us_per_frame": {p: timer.totals[p] / frames / 1000 for p in PHASES},
+        "bytes_per_frame": display.total_bytes / frames,
+        "hash": digest.hexdigest()[:16],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark host di RoboEyesCP")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--fps", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--check", action="store_true", help="solo confronto golden, exit 1 se differiscono")
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args(argv)
+
+    golden = {}
+    if os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH) as f: golden = json.load(f)
+    params = {"frames": args.frames, "fps": args.fps, "seed": args.seed}
+    comparable = golden.get("params") == params
+
+    results, mismatches = {}, []
+    for width, height in SCREEN_SIZES:
+        for backend in BACKENDS:
+            # Le chiavi del backend blit restano "WxH" come nei golden già registrati
+            key = f"{width}x{height}" if backend == robo_eyes_cp.CP_BACKEND_BLIT else f"{width}x{height}/{backend}"
+            res = run_size(width, height, args.frames, args.fps, args.seed, backend)
+            results[key] = res
+            expected = golden.get("hashes", {}).get(key)
+            status = "nuovo" if expected is None or not comparable else "ok" if expected == res["hash"] else "DIVERSO"
+            if status == "DIVERSO": mismatches.append(key)
+            if args.check:
+                print(f"{key:>17} {res['hash']} {status}")
+                continue
+            phases = " ".join(f"{p}={res['us_per_frame'][p]:7.1f}" for p in PHASES)
+            total = sum(res["us_per_frame"].values())
+            sprite = ""
+            if backend == robo_eyes_cp.CP_BACKEND_BLIT: # Boot: sprite generati a runtime contro letti dal pack
+                sprite = f"sprite {_sprite_build_ms(width, height):6.2f} ms pack {_sprite_build_ms(width, height, pack=True):6.2f} ms "
+            print(f"{key:>17} frame {total:8.1f} us [{phases}] drawn {res['drawn']}/{res['frames']} "
+                  f"bus {res['bytes_per_frame']:6.1f} B/frame {sprite}golden {status}")
+
+    width, height, fps, frames = COMMAND_RUN
+    key = f"{width}x{height}/commands"
+    res = run_size(width, height, frames, fps, args.seed, commands=True)
+    results[key] = res
+    expected = golden.get("hashes", {}).get(key)
+    status = "nuovo" if expected is None or golden.get("params", {}).get("seed") != args.seed else "ok" if expected == res["hash"] else "DIVERSO"
+    if status == "DIVERSO": mismatches.append(key)
+    if args.check: print(f"{key:>17} {res['hash']} {status}")
+    else: print(f"{key:>17} drawn {res['drawn']}/{res['frames']} golden {status}")
+
+    if args.update_golden:
+        with open(GOLDEN_PATH, "w") as f:
+            json.dump({"params": params, "hashes": {k: r["hash"] for k, r in results.items()}}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"golden aggiornati in {GOLDEN_PATH}")
+        return 0
+    if mismatches:
+        print("frame diversi dai golden: " + ", ".join(mismatches))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
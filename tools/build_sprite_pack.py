@@ -0,0 +1,32 @@
+# build_sprite_pack.py
+# Step di build lato host: genera il pack di sprite precompilati per una geometria
+# occhio, da copiare in /sd/robo_eyes_sprites.bin (o dove punta sprite_pack_path).
+#
+#   python tools/build_sprite_pack.py                       # geometria di default 36x36 r8
+#   python tools/build_sprite_pack.py -W 24 -H 24 -r 6 -o /media/CIRCUITPY/sd/robo_eyes_sprites.bin
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from robo_eyes_pack import sprite_specs, write_sprite_pack  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera il pack di sprite per RoboEyesCP")
+    parser.add_argument("-W", "--eye-width", type=int, default=36)
+    parser.add_argument("-H", "--eye-height", type=int, default=36)
+    parser.add_argument("-r", "--radius", type=int, default=8)
+    parser.add_argument("-o", "--output", default=os.path.join("sd", "robo_eyes_sprites.bin"))
+    args = parser.parse_args(argv)
+
+    with open(args.output, "wb") as f:
+        size = write_sprite_pack(f, args.eye_width, args.eye_height, args.radius)
+    names = ", ".join(f"{n} {w}x{h} r{r}" for n, w, h, r in sprite_specs(args.eye_width, args.eye_height, args.radius))
+    print(f"{args.output}: {size} byte ({names})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# bitmaptools.py (host)
+# Sostituto pure-Python delle funzioni di bitmaptools usate da robo_eyes_cp.
+# I controlli sugli argomenti seguono il comportamento di CircuitPython 9.x:
+# blit() rifiuta destinazioni fuori dal bitmap, fill_region() ritaglia.
+
+
+def _clip(v, lo, hi):
+    return lo if v < lo else hi if v > hi else v
+
+
+def fill_region(dest_bitmap, x1, y1, x2, y2, value):
+    if x1 > x2: x1, x2 = x2, x1
+    if y1 > y2: y1, y2 = y2, y1
+    x1 = _clip(x1, 0, dest_bitmap.width); x2 = _clip(x2, 0, dest_bitmap.width)
+    y1 = _clip(y1, 0, dest_bitmap.height); y2 = _clip(y2, 0, dest_bitmap.height)
+    if x2 <= x1 or y2 <= y1: return
+    if not (0 <= value < dest_bitmap.value_count): raise ValueError("valore fuori range")
+    data, w = dest_bitmap._data, dest_bitmap.width
+    run = bytes((value,)) * (x2 - x1) if isinstance(data, bytearray) else [value] * (x2 - x1)
+    for y in range(y1, y2):
+        data[y * w + x1:y * w + x2] = run
+    dest_bitmap._mark_dirty(x1, y1, x2, y2)
+
+
+def blit(dest_bitmap, source_bitmap, x, y, *, x1=0, y1=0, x2=None, y2=None,
+         skip_source_index=None, skip_dest_index=None):
+    if x2 is None: x2 = source_bitmap.width
+    if y2 is None: y2 = source_bitmap.height
+    if x < 0 or y < 0 or x > dest_bitmap.width or y > dest_bitmap.height:
+        raise ValueError("out of range of target")
+    if x1 > x2: x1, x2 = x2, x1
+    if y1 > y2: y1, y2 = y2, y1
+    x1 = _clip(x1, 0, source_bitmap.width); x2 = _clip(x2, 0, source_bitmap.width)
+    y1 = _clip(y1, 0, source_bitmap.height); y2 = _clip(y2, 0, source_bitmap.height)
+    # Ritaglio contro la destinazione
+    x2 = min(x2, x1 + dest_bitmap.width - x)
+    y2 = min(y2, y1 + dest_bitmap.height - y)
+    if x2 <= x1 or y2 <= y1: return
+    dd, dw = dest_bitmap._data, dest_bitmap.width
+    sd, sw = source_bitmap._data, source_bitmap.width
+    n = x2 - x1
+    if skip_source_index is None and skip_dest_index is None:
+        for sy in range(y1, y2):
+            d = (y + sy - y1) * dw + x
+            dd[d:d + n] = sd[sy * sw + x1:sy * sw + x2]
+    else:
+        for sy in range(y1, y2):
+            d = (y + sy - y1) * dw + x
+            s = sy * sw + x1
+            for i in range(n):
+                v = sd[s + i]
+                if v == skip_source_index or dd[d + i] == skip_dest_index: continue
+                dd[d + i] = v
+    dest_bitmap._mark_dirty(x, y, x + n, y + y2 - y1)
+
+
+def arrayblit(bitmap, data, x1=0, y1=0, x2=None, y2=None, skip_index=None):
+    if x2 is None: x2 = bitmap.width
+    if y2 is None: y2 = bitmap.height
+    if not (0 <= x1 <= x2 <= bitmap.width and 0 <= y1 <= y2 <= bitmap.height):
+        raise ValueError("regione fuori dal bitmap")
+    n = x2 - x1
+    if len(data) < n * (y2 - y1): raise ValueError("buffer troppo piccolo")
+    dd, dw = bitmap._data, bitmap.width
+    for row in range(y2 - y1):
+        d = (y1 + row) * dw + x1
+        if skip_index is None:
+            dd[d:d + n] = data[row * n:row * n + n]
+        else:
+            for i in range(n):
+                v = data[row * n + i]
+                if v != skip_index: dd[d + i] = v
+    bitmap._mark_dirty(x1, y1, x2, y2)
+
+
+def readinto(bitmap, file, bits_per_pixel, element_size=1, reverse_pixels_in_element=False,
+             swap_bytes_in_element=False, reverse_rows=False):
+    if bits_per_pixel not in (1, 2, 4, 8, 16, 24, 32): raise ValueError("bits_per_pixel non valido")
+    if bits_per_pixel < 8 and (swap_bytes_in_element or element_size != 1):
+        raise NotImplementedError("solo element_size=1 per profondità < 8 bit sull'host")
+    bits_per_element = element_size * 8
+    rowsize = element_size * ((bits_per_pixel * bitmap.width + bits_per_element - 1) // bits_per_element)
+    mask = (1 << bits_per_pixel) - 1
+    per_byte = 8 // bits_per_pixel if bits_per_pixel < 8 else 1
+    w = bitmap.width
+    for row in range(bitmap.height):
+        buf = file.read(rowsize)
+        if len(buf) < rowsize: raise EOFError("file troppo corto")
+        y = bitmap.height - 1 - row if reverse_rows else row
+        base = y * w
+        for x in range(w):
+            if bits_per_pixel < 8:
+                b = buf[x // per_byte]
+                slot = x % per_byte
+                shift = slot * bits_per_pixel if reverse_pixels_in_element else 8 - bits_per_pixel * (slot + 1)
+                v = (b >> shift) & mask
+            else:
+                nb = bits_per_pixel // 8
+                chunk = buf[x * nb:(x + 1) * nb]
+                v = int.from_bytes(chunk, "little" if swap_bytes_in_element else "big")
+            if v >= bitmap.value_count: raise ValueError("valore fuori range")
+            bitmap._data[base + x] = v
+    bitmap._mark_dirty(0, 0, bitmap.width, bitmap.height)
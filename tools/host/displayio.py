@@ -0,0 +1,173 @@
+# displayio.py (host)
+# Sostituto pure-Python del sottoinsieme di displayio usato da robo_eyes_cp,
+# per eseguire e profilare la libreria su una workstation (Linux/CI).
+# Non è un emulatore completo: implementa solo quello che serve alla libreria
+# e agli strumenti in tools/.
+
+
+def release_displays():
+    pass
+
+
+def _union(a, b):
+    if a is None: return b
+    if b is None: return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class Bitmap:
+    def __init__(self, width, height, value_count):
+        if width < 0 or height < 0: raise ValueError("dimensioni non valide")
+        if value_count < 1 or value_count > 65536: raise ValueError("value_count non valido")
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self._data = bytearray(width * height) if value_count <= 256 else [0] * (width * height)
+        # Area sporca (x0, y0, x1, y1) esclusiva, come la traccia displayio
+        self._dirty = (0, 0, width, height) if width and height else None
+
+    def _index(self, key):
+        if isinstance(key, tuple):
+            x, y = key
+            if not (0 <= x < self.width and 0 <= y < self.height): raise IndexError("pixel fuori dal bitmap")
+            return y * self.width + x
+        if not (0 <= key < self.width * self.height): raise IndexError("pixel fuori dal bitmap")
+        return key
+
+    def __getitem__(self, key):
+        return self._data[self._index(key)]
+
+    def __setitem__(self, key, value):
+        i = self._index(key)
+        if not (0 <= value < self.value_count): raise ValueError("valore fuori range")
+        self._data[i] = value
+        x, y = i % self.width, i // self.width
+        self._mark_dirty(x, y, x + 1, y + 1)
+
+    def __len__(self):
+        return self.width * self.height
+
+    def _mark_dirty(self, x0, y0, x1, y1):
+        if x1 > x0 and y1 > y0: self._dirty = _union(self._dirty, (x0, y0, x1, y1))
+
+    def fill(self, value):
+        if not (0 <= value < self.value_count): raise ValueError("valore fuori range")
+        if isinstance(self._data, bytearray): self._data[:] = bytes((value,)) * len(self._data)
+        else: self._data[:] = [value] * len(self._data)
+        self._mark_dirty(0, 0, self.width, self.height)
+
+    def dirty(self, x1=0, y1=0, x2=None, y2=None):
+        self._mark_dirty(x1, y1, self.width if x2 is None else x2, self.height if y2 is None else y2)
+
+
+class Palette:
+    def __init__(self, color_count, *, dither=False):
+        self._colors = [0] * color_count
+        self._transparent = [False] * color_count
+        self.dither = dither
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, index):
+        return self._colors[index]
+
+    def __setitem__(self, index, value):
+        self._colors[index] = value
+
+    def make_transparent(self, index):
+        self._transparent[index] = True
+
+    def make_opaque(self, index):
+        self._transparent[index] = False
+
+    def is_transparent(self, index):
+        return self._transparent[index]
+
+
+class TileGrid:
+    def __init__(self, bitmap, *, pixel_shader, width=1, height=1, tile_width=None, tile_height=None,
+                 default_tile=0, x=0, y=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.width = width
+        self.height = height
+        self.tile_width = bitmap.width if tile_width is None else tile_width
+        self.tile_height = bitmap.height if tile_height is None else tile_height
+        if bitmap.width % self.tile_width or bitmap.height % self.tile_height:
+            raise ValueError("il bitmap non è un multiplo della tile")
+        self._tiles_per_row = bitmap.width // self.tile_width
+        self._tile_count = self._tiles_per_row * (bitmap.height // self.tile_height)
+        self._tiles = [default_tile] * (width * height)
+        self.x = x
+        self.y = y
+        self.hidden = False
+
+    def _index(self, key):
+        if isinstance(key, tuple): return key[1] * self.width + key[0]
+        return key
+
+    def __getitem__(self, key):
+        return self._tiles[self._index(key)]
+
+    def __setitem__(self, key, value):
+        if not (0 <= value < self._tile_count): raise ValueError("tile fuori range")
+        self._tiles[self._index(key)] = value
+
+    def _pixel(self, lx, ly):
+        # Indice palette del pixel locale (lx, ly), None se trasparente
+        tx, px = divmod(lx, self.tile_width)
+        ty, py = divmod(ly, self.tile_height)
+        tile = self._tiles[ty * self.width + tx]
+        bx = (tile % self._tiles_per_row) * self.tile_width + px
+        by = (tile // self._tiles_per_row) * self.tile_height + py
+        v = self.bitmap._data[by * self.bitmap.width + bx]
+        if self.pixel_shader.is_transparent(v): return None
+        return v
+
+    def _geometry(self):
+        return (self.x, self.y, self.width * self.tile_width, self.height * self.tile_height,
+                tuple(self._tiles), self.hidden)
+
+
+class Group:
+    def __init__(self, *, scale=1, x=0, y=0):
+        if scale != 1: raise NotImplementedError("scale != 1 non supportato sull'host")
+        self.scale = scale
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self._layers = []
+
+    def append(self, layer):
+        self._layers.append(layer)
+
+    def insert(self, index, layer):
+        self._layers.insert(index, layer)
+
+    def remove(self, layer):
+        self._layers.remove(layer)
+
+    def pop(self, i=-1):
+        return self._layers.pop(i)
+
+    def index(self, layer):
+        return self._layers.index(layer)
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __getitem__(self, index):
+        return self._layers[index]
+
+    def __setitem__(self, index, layer):
+        self._layers[index] = layer
+
+    def __delitem__(self, index):
+        del self._layers[index]
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def __contains__(self, layer):
+        return layer in self._layers
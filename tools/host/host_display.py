@@ -0,0 +1,91 @@
+# host_display.py (host)
+# Display finto per workstation: compone il root_group in un framebuffer 1-bit
+# e stima i byte trasferiti sul bus per ogni refresh (area sporca, pagine SSD1306).
+
+import hashlib
+
+import displayio
+
+
+class HostDisplay:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.root_group = None
+        self.auto_refresh = True
+        self.framebuffer = bytearray(width * height)
+        self.refresh_count = 0
+        self.last_refresh_bytes = 0
+        self.total_bytes = 0
+        self._last_geometry = {}
+
+    def _tilegrids(self, group, ox, oy, out):
+        if group is None or group.hidden: return out
+        ox += group.x; oy += group.y
+        for layer in group:
+            if isinstance(layer, displayio.Group): self._tilegrids(layer, ox, oy, out)
+            else: out.append((layer, ox, oy))
+        return out
+
+    def _dirty_box(self, grids):
+        box = None
+        seen = {}
+        for tg, ox, oy in grids:
+            geo = (tg.x + ox, tg.y + oy) + tg._geometry()[2:]
+            seen[id(tg)] = geo
+            old = self._last_geometry.get(id(tg))
+            x, y, w, h = geo[0], geo[1], geo[2], geo[3]
+            if old != geo:
+                box = displayio._union(box, (x, y, x + w, y + h))
+                if old is not None: box = displayio._union(box, (old[0], old[1], old[0] + old[2], old[1] + old[3]))
+            elif tg.bitmap._dirty is not None and not tg.hidden:
+                d = tg.bitmap._dirty
+                if tg.width == 1 and tg.height == 1 and tg.tile_width == tg.bitmap.width and tg.tile_height == tg.bitmap.height:
+                    box = displayio._union(box, (x + d[0], y + d[1], x + d[2], y + d[3]))
+                else:
+                    box = displayio._union(box, (x, y, x + w, y + h))
+        for key, old in self._last_geometry.items():
+            if key not in seen: box = displayio._union(box, (old[0], old[1], old[0] + old[2], old[1] + old[3]))
+        self._last_geometry = seen
+        for tg, _, _ in grids: tg.bitmap._dirty = None
+        if box is None: return None
+        x0, y0 = max(0, box[0]), max(0, box[1])
+        x1, y1 = min(self.width, box[2]), min(self.height, box[3])
+        if x1 <= x0 or y1 <= y0: return None
+        return (x0, y0, x1, y1)
+
+    def _compose(self, grids, box):
+        # Ricompone solo l'area sporca: il resto del framebuffer è già aggiornato
+        fb, w = self.framebuffer, self.width
+        bx0, by0, bx1, by1 = box
+        for y in range(by0, by1): fb[y * w + bx0:y * w + bx1] = bytes(bx1 - bx0)
+        for tg, ox, oy in grids:
+            if tg.hidden: continue
+            gx, gy = tg.x + ox, tg.y + oy
+            tw, th = tg.width * tg.tile_width, tg.height * tg.tile_height
+            pal = tg.pixel_shader
+            for ly in range(max(0, by0 - gy), min(th, by1 - gy)):
+                row = (gy + ly) * w
+                for lx in range(max(0, bx0 - gx), min(tw, bx1 - gx)):
+                    v = tg._pixel(lx, ly)
+                    if v is not None: fb[row + gx + lx] = 1 if pal[v] else 0
+
+    def refresh(self, *, target_frames_per_second=None, minimum_frames_per_second=0):
+        grids = self._tilegrids(self.root_group, 0, 0, [])
+        box = self._dirty_box(grids)
+        self.refresh_count += 1
+        self.last_refresh_bytes = 0
+        if box is None: return True
+        self._compose(grids, box)
+        # SSD1306: le righe viaggiano a pagine da 8 pixel, un byte per colonna per pagina
+        pages = (box[3] - 1) // 8 - box[1] // 8 + 1
+        self.last_refresh_bytes = (box[2] - box[0]) * pages
+        self.total_bytes += self.last_refresh_bytes
+        return True
+
+    def auto_tick(self):
+        # Sull'host non c'è un refresh in background: il chiamante lo simula
+        if self.auto_refresh: self.refresh()
+
+    def frame_hash(self):
+        return hashlib.sha1(bytes(self.framebuffer)).hexdigest()[:16]
@@ -0,0 +1,40 @@
+# record_stream.py
+# Step di build lato host: simula RoboEyesCP col backend host (tools/host) e registra
+# i frame in uno stream per robo_eyes_stream.StreamPlayer, da copiare in /sd.
+#
+#   python tools/record_stream.py                          # 128x64, 60 s a 20 fps
+#   python tools/record_stream.py -W 128 -H 32 -s 30 -o /media/CIRCUITPY/sd/robo_eyes_stream.bin
+
+import argparse
+import os
+import sys
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(_HERE, "host"), os.path.join(_HERE, "..", "lib")]
+
+import robo_eyes_cp  # noqa: E402
+from host_display import HostDisplay  # noqa: E402
+from robo_eyes_stream import record_frames  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registra uno stream di frame di RoboEyesCP")
+    parser.add_argument("-W", "--width", type=int, default=128)
+    parser.add_argument("-H", "--height", type=int, default=64)
+    parser.add_argument("-s", "--seconds", type=float, default=60.0)
+    parser.add_argument("--fps", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("-o", "--output", default=os.path.join("sd", "robo_eyes_stream.bin"))
+    args = parser.parse_args(argv)
+
+    eyes = robo_eyes_cp.RoboEyesCP(HostDisplay(args.width, args.height), clock=robo_eyes_cp.ManualClock(0.0), seed=args.seed)
+    eyes.sprite_pack_path = None
+    eyes.begin(args.width, args.height, args.fps)
+    n = int(args.seconds * args.fps)
+    with open(args.output, "wb") as f:
+        rec = record_frames(eyes, f, n, 1.0 / args.fps)
+    print(f"{args.output}: {rec.bytes_written} byte, {rec.frames} frame scritti su {n} ({args.seconds:g} s a {args.fps} fps)")
+
+
+if __name__ == "__main__":
+    main()